@@ -0,0 +1,56 @@
+"""
+Compares building an instance with BaseProblem.create_instance, through
+AbstractModel.create_instance, against BaseProblem.build_concrete. Both
+build from the same already fetched data. The diet problem is timed as a
+whole and with its sets and params only, where the constraint rules do not
+dominate.
+
+Usage:
+    python benchmarks/bench_build.py [n_foods] [n_nutrients]
+"""
+import sys
+import time
+
+from diet import (DietProblem, Food, FoodNutrientAmount, Nutrient, BaseProblem,
+                  ORMSet, ORMParam, setup)
+
+
+class DietDataProblem(BaseProblem):
+    foods = ORMSet(model=Food, from_attr='id', indexed_by=None)
+    nutrients = ORMSet(model=Nutrient, from_attr='id', indexed_by=None)
+    amount = ORMParam(
+        'foods',
+        'nutrients',
+        model=FoodNutrientAmount,
+        from_attr='amount',
+        indexed_by=['food_id', 'nutrient_id'],
+        default=0.0
+    )
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main(n_foods=1000, n_nutrients=50):
+    setup(n_foods, n_nutrients)
+    print('{} foods x {} nutrients'.format(n_foods, n_nutrients))
+    for problem_class in (DietProblem, DietDataProblem):
+        problem = problem_class('Diet')
+        problem.define_problem()
+        data = problem.data
+        results = [
+            ('abstract', timed(problem.create_instance, data=data)),
+            ('concrete', timed(problem.build_concrete, data=data)),
+            ('mutable', timed(problem.build_concrete, mutable=True, data=data)),
+        ]
+        print(problem_class.__name__)
+        baseline = results[0][1]
+        for name, seconds in results:
+            print('{:<10} {:8.3f}s  {:5.1f}x'.format(name, seconds, baseline / seconds))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
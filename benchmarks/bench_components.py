@@ -0,0 +1,101 @@
+"""
+Times the component bookkeeping of a problem with many components: 500 by
+default, split between a base problem class and a subclass. Reading the
+component accessors through the class registry is compared against the
+dir() scan BaseProblem used before, and define_problem and create_instance
+are timed as a whole.
+
+Usage:
+    python benchmarks/bench_components.py [n_components] [n_foods]
+"""
+import sys
+import time
+
+from diet import (Food, BaseProblem, ORMSet, ORMParam, ORMVar, orm_constraint,
+                  NonNegativeReals, setup)
+from pyomo_orm.core.wrappers import (ORMConstraint, ORMObjective)
+
+KINDS = (ORMSet, ORMParam, ORMVar, ORMConstraint, ORMObjective)
+
+
+def make_problem_class(n_components):
+    """
+    Returns a problem class with n_components components: a set, a var,
+    one constraint per ten components and params for the rest. Half of the
+    params are defined on a base class.
+    """
+    n_constraints = n_components // 10
+    n_params = n_components - n_constraints - 2
+    base_attrs = {
+        'foods': ORMSet(model=Food, from_attr='id', indexed_by=None),
+        'amount_in_diet': ORMVar(
+            'foods',
+            model=Food,
+            from_attr='amount_in_diet',
+            within=NonNegativeReals
+        ),
+    }
+    attrs = {}
+    for i in range(n_params):
+        target = base_attrs if i < n_params // 2 else attrs
+        target['param_{}'.format(i)] = ORMParam('foods', model=Food, from_attr='cost')
+    for i in range(n_constraints):
+        param = 'param_{}'.format(i % n_params)
+        attrs['constraint_{}'.format(i)] = orm_constraint('foods')(
+            lambda m, f, param=param: getattr(m, param)[f] * m.amount_in_diet[f] >= 0
+        )
+    base = type('ManyComponentsBase', (BaseProblem,), base_attrs)
+    return type('ManyComponentsProblem', (base,), attrs)
+
+
+def dir_scan(problem, kind):
+    """
+    The component lookup BaseProblem used before the class registry
+    """
+    ret = {}
+    for attr in dir(type(problem)):
+        if isinstance(getattr(type(problem), attr), kind):
+            ret[attr] = getattr(problem, attr)
+    return ret
+
+
+def read_accessors(problem, lookup):
+    """
+    Reads every accessor once, and the index sets of every component, which
+    is what the build path does
+    """
+    for kind in KINDS:
+        for component in lookup(problem, kind).values():
+            for set_name in component._index_orm_set_names:
+                lookup(problem, ORMSet)[set_name]
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main(n_components=500, n_foods=100):
+    setup(n_foods, 1)
+    start = time.perf_counter()
+    problem_class = make_problem_class(n_components)
+    class_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    problem = problem_class('Many components')
+    init_seconds = time.perf_counter() - start
+    print('{} components, {} foods'.format(n_components, n_foods))
+    print('{:<18} {:8.4f}s'.format('class creation', class_seconds))
+    print('{:<18} {:8.4f}s'.format('__init__', init_seconds))
+
+    scan = timed(read_accessors, problem, dir_scan)
+    registry = timed(read_accessors, problem, BaseProblem._get_orm_components)
+    print('{:<18} {:8.4f}s'.format('accessors dir()', scan))
+    print('{:<18} {:8.4f}s  {:6.1f}x'.format('accessors registry', registry, scan / registry))
+
+    print('{:<18} {:8.4f}s'.format('define_problem', timed(problem.define_problem)))
+    print('{:<18} {:8.4f}s'.format('create_instance', timed(problem.create_instance)))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,46 @@
+"""
+Compares BaseModelMixin.get_data against the hydrating path it replaced, which
+loaded every row as an ORM object before reading the columns off it.
+
+Usage:
+    python benchmarks/bench_get_data.py [n_foods] [n_nutrients]
+"""
+import sys
+import time
+
+from diet import FoodNutrientAmount, Session, setup
+
+
+def hydrating_get_data(model, from_attr, indexed_by):
+    return dict(
+        (
+            tuple(getattr(m, ind) for ind in indexed_by),
+            getattr(m, from_attr)
+        ) for m in model.query().all() if getattr(m, from_attr) is not None
+    )
+
+
+def timed(func, *args, **kwargs):
+    Session.remove()
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main(n_foods=2000, n_nutrients=50):
+    setup(n_foods, n_nutrients)
+    indexed_by = ['food_id', 'nutrient_id']
+    results = [
+        ('hydrating', timed(hydrating_get_data, FoodNutrientAmount, 'amount', indexed_by)),
+        ('projected', timed(FoodNutrientAmount.get_data, 'amount', indexed_by)),
+        ('numpy', timed(FoodNutrientAmount.get_data, 'amount', indexed_by, columnar='numpy')),
+        ('pandas', timed(FoodNutrientAmount.get_data, 'amount', indexed_by, columnar='pandas')),
+    ]
+    print('{} rows'.format(n_foods * n_nutrients))
+    baseline = results[0][1]
+    for name, seconds in results:
+        print('{:<10} {:8.3f}s  {:5.1f}x'.format(name, seconds, baseline / seconds))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
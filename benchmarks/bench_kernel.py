@@ -0,0 +1,105 @@
+"""
+Compares building the diet problem, the diet problem with its nutrient
+constraints as an ORMLinearConstraint (see bench_linear.py) and a problem
+with a var and a constraint per FoodNutrientAmount row, as environ models
+(create_instance of the AbstractModel, and build_concrete) and as
+pyomo.kernel blocks (__backend__ = 'kernel'). The data is fetched before
+the builds. The build time is measured without tracing; the peak traced
+memory of the build and the memory still held by the instance are measured
+in a second build.
+
+Usage:
+    python benchmarks/bench_kernel.py [n_foods] [n_nutrients]
+"""
+import gc
+import sys
+import time
+import tracemalloc
+
+from bench_linear import LinearDietProblem
+from diet import (DietProblem, FoodNutrientAmount, ORMSet, ORMParam, ORMVar,
+                  NonNegativeReals, orm_constraint, orm_objective, setup)
+
+
+class FlowProblem(DietProblem):
+    food_nutrients = ORMSet(
+        'foods',
+        'nutrients',
+        model=FoodNutrientAmount,
+        from_attr=('food_id', 'nutrient_id')
+    )
+    amount = ORMParam(
+        'food_nutrients',
+        model=FoodNutrientAmount,
+        from_attr='amount',
+        indexed_by=['food_id', 'nutrient_id']
+    )
+    flow = ORMVar('food_nutrients', model=FoodNutrientAmount, within=NonNegativeReals)
+    nutrient_lower_bound_rule = None
+
+    @orm_constraint('food_nutrients')
+    def flow_limit(m, i, j):
+        return m.flow[i, j] <= m.amount[i, j] * m.amount_in_diet[i]
+
+    @orm_objective()
+    def total_cost(m):
+        return sum(m.cost[i] * m.amount_in_diet[i] for i in m.foods) - sum(m.flow.values())
+
+
+class KernelDietProblem(DietProblem):
+    __backend__ = 'kernel'
+
+
+class KernelLinearDietProblem(LinearDietProblem):
+    __backend__ = 'kernel'
+
+
+class KernelFlowProblem(FlowProblem):
+    __backend__ = 'kernel'
+
+
+BUILDS = [
+    (DietProblem, 'abstract'),
+    (DietProblem, 'concrete'),
+    (KernelDietProblem, 'kernel'),
+    (LinearDietProblem, 'abstract'),
+    (LinearDietProblem, 'concrete'),
+    (KernelLinearDietProblem, 'kernel'),
+    (FlowProblem, 'abstract'),
+    (FlowProblem, 'concrete'),
+    (KernelFlowProblem, 'kernel'),
+]
+
+
+def build(problem, how, data):
+    if how == 'concrete':
+        return problem.build_concrete(data=data)
+    return problem.create_instance(data=data)
+
+
+def main(n_foods=2000, n_nutrients=100):
+    setup(n_foods, n_nutrients)
+    print('{} foods x {} nutrients'.format(n_foods, n_nutrients))
+    print('{:<24} {:<9} {:>8} {:>10} {:>10}'.format(
+        'problem', 'build', 'seconds', 'peak MB', 'held MB'
+    ))
+    for problem_class, how in BUILDS:
+        problem = problem_class(problem_class.__name__)
+        problem.define_problem()
+        data = problem.data
+        start = time.perf_counter()
+        build(problem, how, data)
+        seconds = time.perf_counter() - start
+        problem.instance = None
+        gc.collect()
+        tracemalloc.start()
+        build(problem, how, data)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print('{:<24} {:<9} {:8.3f} {:10.1f} {:10.1f}'.format(
+            problem_class.__name__, how, seconds, peak / 2**20, current / 2**20
+        ))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,55 @@
+"""
+Compares building the diet problem's nutrient constraints with a rule per
+nutrient, as DietProblem does, against an ORMLinearConstraint that builds
+them from the FoodNutrientAmount.amount columns in bulk. The bulk
+version reads the coefficients itself, so it has no amount param. The
+data, including the coefficients, is fetched before the builds are timed.
+
+Usage:
+    python benchmarks/bench_linear.py [n_foods] [n_nutrients]
+"""
+import sys
+import time
+
+from diet import DietProblem, FoodNutrientAmount, setup
+from pyomo_orm.core.wrappers import ORMLinearConstraint
+
+
+class LinearDietProblem(DietProblem):
+    amount = None
+    nutrient_lower_bound_rule = None
+    nutrient_lower_bound_linear = ORMLinearConstraint(
+        'nutrients',
+        var='amount_in_diet',
+        model=FoodNutrientAmount,
+        from_attr='amount',
+        row_by='nutrient_id',
+        var_by='food_id',
+        lower='nutrient_lower_bound'
+    )
+
+
+def main(n_foods=2000, n_nutrients=100):
+    setup(n_foods, n_nutrients)
+    print('{} foods x {} nutrients'.format(n_foods, n_nutrients))
+    baseline = None
+    for problem_class in (DietProblem, LinearDietProblem):
+        problem = problem_class(problem_class.__name__)
+        problem.define_problem()
+        data = problem.data
+        for build in ('abstract', 'concrete'):
+            start = time.perf_counter()
+            if build == 'abstract':
+                problem.create_instance(data=data)
+            else:
+                problem.build_concrete(data=data)
+            seconds = time.perf_counter() - start
+            if baseline is None:
+                baseline = seconds
+            print('{:<18} {:<9} {:8.3f}s  {:5.1f}x'.format(
+                problem_class.__name__, build, seconds, baseline / seconds
+            ))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
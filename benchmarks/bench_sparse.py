@@ -0,0 +1,104 @@
+"""
+Compares a param, var and constraint indexed by the dense foods x nutrients
+product against the same components indexed by a sparse ORMSet of the
+(food_id, nutrient_id) pairs that have a FoodNutrientAmount row. The
+instance build time, peak traced memory and number of entries are shown.
+
+Usage:
+    python benchmarks/bench_sparse.py [n_foods] [n_nutrients] [density]
+"""
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from diet import (BaseProblem, Food, FoodNutrientAmount, Nutrient, ORMSet,
+                  ORMParam, ORMVar, NonNegativeReals, bind_engine, create_all,
+                  generate, orm_constraint, orm_objective)
+
+
+class DenseProblem(BaseProblem):
+    foods = ORMSet(model=Food, from_attr='id', indexed_by=None)
+    nutrients = ORMSet(model=Nutrient, from_attr='id', indexed_by=None)
+    amount = ORMParam(
+        'foods',
+        'nutrients',
+        model=FoodNutrientAmount,
+        from_attr='amount',
+        indexed_by=['food_id', 'nutrient_id'],
+        default=0.0
+    )
+    flow = ORMVar('foods', 'nutrients', model=FoodNutrientAmount, within=NonNegativeReals)
+
+    @orm_constraint('foods', 'nutrients')
+    def flow_limit(m, i, j):
+        return m.flow[i, j] <= m.amount[i, j]
+
+    @orm_objective()
+    def total_flow(m):
+        return sum(m.flow.values())
+
+
+class SparseProblem(BaseProblem):
+    foods = ORMSet(model=Food, from_attr='id', indexed_by=None)
+    nutrients = ORMSet(model=Nutrient, from_attr='id', indexed_by=None)
+    food_nutrients = ORMSet(
+        'foods',
+        'nutrients',
+        model=FoodNutrientAmount,
+        from_attr=('food_id', 'nutrient_id')
+    )
+    amount = ORMParam(
+        'food_nutrients',
+        model=FoodNutrientAmount,
+        from_attr='amount',
+        indexed_by=['food_id', 'nutrient_id']
+    )
+    flow = ORMVar('food_nutrients', model=FoodNutrientAmount, within=NonNegativeReals)
+
+    @orm_constraint('food_nutrients')
+    def flow_limit(m, i, j):
+        return m.flow[i, j] <= m.amount[i, j]
+
+    @orm_objective()
+    def total_flow(m):
+        return sum(m.flow.values())
+
+
+def setup(n_foods, n_nutrients, density, seed=0):
+    """
+    Fills a new database with foods and nutrients and an amount for a
+    random density fraction of their pairs
+    """
+    bind_engine('sqlite://')
+    create_all()
+    foods, nutrients, amounts = generate(n_foods, n_nutrients, seed)
+    keep = np.random.RandomState(seed).uniform(size=len(amounts)) < density
+    Food.bulk_load_dataframe(foods)
+    Nutrient.bulk_load_dataframe(nutrients)
+    FoodNutrientAmount.bulk_load_dataframe(amounts[keep])
+
+
+def main(n_foods=2000, n_nutrients=100, density=0.05):
+    setup(n_foods, n_nutrients, density)
+    print('{} foods x {} nutrients, density {}'.format(n_foods, n_nutrients, density))
+    print('{:<14} {:>8} {:>10} {:>10}'.format('problem', 'seconds', 'peak MB', 'entries'))
+    for problem_class in (DenseProblem, SparseProblem):
+        problem = problem_class(problem_class.__name__)
+        problem.define_problem()
+        data = problem.data
+        tracemalloc.start()
+        start = time.perf_counter()
+        instance = problem.create_instance(data=data)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        entries = len(instance.amount) + len(instance.flow) + len(instance.flow_limit)
+        print('{:<14} {:8.3f} {:10.1f} {:10d}'.format(
+            problem_class.__name__, seconds, peak / 2**20, entries
+        ))
+
+
+if __name__ == '__main__':
+    main(*[parse(a) for parse, a in zip((int, int, float), sys.argv[1:])])
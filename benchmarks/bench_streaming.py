@@ -0,0 +1,71 @@
+"""
+Checks that streaming get_data keeps peak memory close to the size of its
+result. FoodNutrientAmount.amount, indexed by (food_id, nutrient_id), is
+fetched as a pyomo data dict and as numpy arrays, loading all rows at once
+and in chunks. Peak traced memory is reported relative to the memory held
+by the result once the fetch is done. Exits with an error if the ratio of a
+chunked fetch is above max_ratio, which defaults to MAX_RATIOS: the numpy
+arrays are small next to the rows of a chunk, so their ratio is higher.
+
+Usage:
+    python benchmarks/bench_streaming.py [n_foods] [n_nutrients] [chunk_size] [max_ratio]
+"""
+import sys
+import time
+import tracemalloc
+
+from diet import FoodNutrientAmount, Session, setup
+
+# loading all rows at once peaks at about 2.4x for dict and 11x for numpy
+MAX_RATIOS = {'dict': 1.5, 'numpy': 3.0}
+
+
+def measure(func, *args, **kwargs):
+    """
+    Returns the seconds taken by func, its peak traced memory and the
+    traced memory still held by its result
+    """
+    Session.remove()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return seconds, peak, current
+
+
+def main(n_foods=20000, n_nutrients=50, chunk_size=10000, max_ratio=None):
+    setup(n_foods, n_nutrients)
+    print('{} rows, chunk_size {}'.format(n_foods * n_nutrients, chunk_size))
+    print('{:<8} {:<8} {:>8} {:>10} {:>10} {:>6}'.format(
+        'result', 'mode', 'seconds', 'peak MB', 'result MB', 'ratio'
+    ))
+    failed = []
+    for columnar in (None, 'numpy'):
+        for mode, size in (('all', None), ('chunked', chunk_size)):
+            seconds, peak, current = measure(
+                FoodNutrientAmount.get_data,
+                'amount',
+                ('food_id', 'nutrient_id'),
+                columnar=columnar,
+                chunk_size=size
+            )
+            print('{:<8} {:<8} {:8.3f} {:10.1f} {:10.1f} {:6.2f}'.format(
+                columnar or 'dict',
+                mode,
+                seconds,
+                peak / 2**20,
+                current / 2**20,
+                peak / current
+            ))
+            bound = max_ratio or MAX_RATIOS[columnar or 'dict']
+            if mode == 'chunked' and peak / current > bound:
+                failed.append('{} (above {})'.format(columnar or 'dict', bound))
+    if failed:
+        sys.exit('chunked peak/result ratio too high for {}'.format(', '.join(failed)))
+
+
+if __name__ == '__main__':
+    main(*[int(a) if a.isdigit() else float(a) for a in sys.argv[1:]])
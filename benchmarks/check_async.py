@@ -0,0 +1,75 @@
+"""
+Checks AsyncBaseProblem against a file-based SQLite database through
+aiosqlite: adata must return the same data as the blocking data property,
+several problems built and solved concurrently on one event loop must each
+record their run, and a refreshable instance built with acreate_instance
+must be up to date. Exits with an error if a check fails.
+
+Needs the async extra (pip install pyomo-orm[async]) and a solver.
+
+Usage:
+    python benchmarks/check_async.py [n_problems] [solver]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from diet import DietProblem, setup
+from pyomo_orm.core.database import bind_async_engine
+from pyomo_orm.core.models import ProblemRun, ProblemRunMembership
+from pyomo_orm.core.problems import AsyncBaseProblem
+
+
+class AsyncDietProblem(AsyncBaseProblem, DietProblem):
+    __refreshable__ = True
+
+
+async def build_and_solve(name, solver, executor):
+    problem = AsyncDietProblem(name)
+    problem.define_problem()
+    await problem.acreate_instance()
+    problem.create_solver(solver)
+    await problem.asolve(executor)
+    return problem
+
+
+async def check(n_problems, solver):
+    problem = AsyncDietProblem('adata')
+    problem.define_problem()
+    adata = await problem.adata()
+    problem.invalidate()
+    assert adata == problem.data, 'adata differs from data'
+
+    # some solver interfaces, e.g. the appsi ones, can't solve in several
+    # threads at once, so the solves take turns in one thread
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        problems = await asyncio.gather(*[
+            build_and_solve('async_{}'.format(i), solver, executor)
+            for i in range(n_problems)
+        ])
+    seconds = time.perf_counter() - start
+    for p in problems:
+        run = p.current_problem_run
+        assert run is not None and run.id is not None, '{} was not recorded'.format(p.name)
+        memberships = ProblemRunMembership.query().filter_by(problem_run_id=run.id).count()
+        assert memberships > 0, '{} recorded no memberships'.format(p.name)
+        assert p.refresh(), '{} is not up to date'.format(p.name)
+    assert ProblemRun.query().count() == n_problems
+    print('{} problems built and solved concurrently in {:.3f}s'.format(n_problems, seconds))
+
+
+def main(n_problems=4, solver='cbc'):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'check_async.sqlite')
+        setup(50, 10, 'sqlite:///{}'.format(path))
+        bind_async_engine('sqlite+aiosqlite:///{}'.format(path))
+        asyncio.run(check(n_problems, solver))
+    print('ok')
+
+
+if __name__ == '__main__':
+    main(*[int(a) if a.isdigit() else a for a in sys.argv[1:]])
@@ -0,0 +1,76 @@
+"""
+Checks the thread-pool fetch of BaseProblem.data (__fetch_workers__ > 1)
+against a file-based SQLite database: it must return the same data as the
+serial fetch, with the same key order, and an error raised while fetching
+a group must reach the caller. Exits with an error if a check fails.
+
+Usage:
+    python benchmarks/check_parallel_fetch.py [n_foods] [n_nutrients] [workers]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from diet import DietProblem, Nutrient, ORMParam, Session, setup
+
+
+class ParallelDietProblem(DietProblem):
+    __fetch_workers__ = 4
+
+
+class BrokenParallelDietProblem(ParallelDietProblem):
+    broken = ORMParam('nutrients', model=Nutrient, from_attr='no_such_column')
+
+
+def ordered(data):
+    """
+    Returns data as nested lists of items, so comparing them also compares
+    the key order
+    """
+    if isinstance(data, dict):
+        return [(k, ordered(v)) for k, v in data.items()]
+    if isinstance(data, (list, tuple)):
+        return [ordered(v) for v in data]
+    return data
+
+
+def fetch(problem_class, name):
+    Session.remove()
+    problem = problem_class(name)
+    problem.define_problem()
+    start = time.perf_counter()
+    data = problem.data
+    return data[problem.namespace], time.perf_counter() - start
+
+
+def check(workers):
+    ParallelDietProblem.__fetch_workers__ = workers
+    serial, serial_seconds = fetch(DietProblem, 'serial')
+    parallel, parallel_seconds = fetch(ParallelDietProblem, 'parallel')
+    assert parallel == serial, 'the parallel fetch returned different data'
+    assert ordered(parallel) == ordered(serial), 'the parallel fetch changed the key order'
+    print('serial   {:.3f}s'.format(serial_seconds))
+    print('parallel {:.3f}s ({} workers)'.format(parallel_seconds, workers))
+
+    try:
+        fetch(BrokenParallelDietProblem, 'broken')
+    except AttributeError as e:
+        assert 'no_such_column' in str(e), 'unexpected error: {}'.format(e)
+    else:
+        raise AssertionError('an error in a fetch worker was not raised')
+
+
+def main(n_foods=2000, n_nutrients=50, workers=4):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'check_parallel_fetch.sqlite')
+        setup(n_foods, n_nutrients, 'sqlite:///{}'.format(path))
+        try:
+            check(workers)
+        finally:
+            Session.remove()
+    print('ok')
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,102 @@
+"""
+Shared set up for the benchmarks: the examples/diet models, a DietProblem
+built from them and a generator of synthetic data.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'examples', 'diet'))
+
+import numpy as np
+import pandas as pd
+from pyomo.environ import NonNegativeReals
+
+from pyomo_orm.core.database import Session, bind_engine
+from pyomo_orm.core.models import create_all
+from pyomo_orm.core.problems import BaseProblem
+from pyomo_orm.core.wrappers import (ORMSet, ORMParam, ORMVar, orm_constraint,
+                                    orm_objective)
+from models import Food, FoodNutrientAmount, Nutrient
+
+
+class DietProblem(BaseProblem):
+    foods = ORMSet(model=Food, from_attr='id', indexed_by=None)
+    nutrients = ORMSet(model=Nutrient, from_attr='id', indexed_by=None)
+
+    cost = ORMParam('foods', model=Food, from_attr='cost')
+    amount = ORMParam(
+        'foods',
+        'nutrients',
+        model=FoodNutrientAmount,
+        from_attr='amount',
+        indexed_by=['food_id', 'nutrient_id'],
+        default=0.0
+    )
+    nutrient_lower_bound = ORMParam(
+        'nutrients',
+        model=Nutrient,
+        from_attr='lower_bound',
+        default=0.0
+    )
+
+    amount_in_diet = ORMVar(
+        'foods',
+        model=Food,
+        from_attr='amount_in_diet',
+        within=NonNegativeReals
+    )
+
+    @orm_constraint('nutrients')
+    def nutrient_lower_bound_rule(m, j):
+        return sum(
+            m.amount[i, j] * m.amount_in_diet[i] for i in m.foods
+        ) >= m.nutrient_lower_bound[j]
+
+    @orm_objective()
+    def total_cost(m):
+        return sum(m.cost[i] * m.amount_in_diet[i] for i in m.foods)
+
+
+def generate(n_foods, n_nutrients, seed=0):
+    """
+    Returns seeded random dataframes of n_foods foods, n_nutrients nutrients
+    and an amount for every (food, nutrient) pair
+    """
+    rng = np.random.RandomState(seed)
+    food_ids = np.arange(1, n_foods + 1)
+    nutrient_ids = np.arange(1, n_nutrients + 1)
+    foods = pd.DataFrame({
+        'id': food_ids,
+        'name': ['food_{}'.format(i) for i in food_ids],
+        'cost': rng.uniform(0.5, 10.0, n_foods),
+        'volume_per_serving': rng.uniform(0.1, 2.0, n_foods)
+    })
+    nutrients = pd.DataFrame({
+        'id': nutrient_ids,
+        'name': ['nutrient_{}'.format(j) for j in nutrient_ids],
+        'lower_bound': rng.uniform(0.0, 100.0, n_nutrients)
+    })
+    amounts = pd.DataFrame({
+        'food_id': np.repeat(food_ids, n_nutrients),
+        'nutrient_id': np.tile(nutrient_ids, n_foods),
+        'amount': rng.uniform(0.0, 50.0, n_foods * n_nutrients)
+    })
+    return foods, nutrients, amounts
+
+
+def populate(n_foods, n_nutrients, seed=0):
+    """
+    Fills the bound database with the data from generate
+    """
+    foods, nutrients, amounts = generate(n_foods, n_nutrients, seed)
+    Food.bulk_load_dataframe(foods)
+    Nutrient.bulk_load_dataframe(nutrients)
+    FoodNutrientAmount.bulk_load_dataframe(amounts)
+
+
+def setup(n_foods, n_nutrients, engine_url='sqlite://', seed=0):
+    engine = bind_engine(engine_url)
+    create_all()
+    populate(n_foods, n_nutrients, seed)
+    return engine
@@ -0,0 +1,164 @@
+"""
+Benchmark suite for the diet problem pipeline. For each size, a fresh
+database is filled with seeded synthetic data and each stage is timed
+separately, recording wall time, peak traced memory and the number of SQL
+statements executed. Results are written as JSON so runs can be compared.
+
+Usage:
+    python benchmarks/run.py [--rows 1000 10000 ...] [--seed 0]
+        [--load-rows 1000] [--db path.sqlite] [--output results.json]
+
+Sizes are numbers of FoodNutrientAmount rows, spread over --nutrients
+nutrients. The row by row load_dataframe stage is run on at most
+--load-rows rows, which are deleted again before the later stages. A stage
+that raises is reported on stderr with its traceback, recorded with an
+error field and makes the suite exit with status 1.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import traceback
+import tracemalloc
+
+from sqlalchemy import event, func
+
+from diet import (DietProblem, Food, FoodNutrientAmount, Nutrient, Session,
+                  bind_engine, create_all, generate)
+from pyomo_orm.core.database import notify_changed
+from pyomo_orm.core.utils import as_dataframe
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self)
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+def run_stage(results, name, counter, func, *args, **kwargs):
+    """
+    Runs func, appending its time, peak memory and statement count to
+    results. Returns func's return value, or None if it raised, in which
+    case the traceback is printed to stderr.
+    """
+    Session.remove()
+    counter.count = 0
+    tracemalloc.start()
+    start = time.perf_counter()
+    ret = None
+    record = {'stage': name}
+    try:
+        ret = func(*args, **kwargs)
+    except Exception as e:
+        record['error'] = '{}: {}'.format(type(e).__name__, e)
+        print('Stage {} failed:\n{}'.format(name, traceback.format_exc()), file=sys.stderr)
+    record['seconds'] = time.perf_counter() - start
+    record['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    record['statements'] = counter.count
+    results.append(record)
+    return ret
+
+
+def delete_rows_after(model, last_id):
+    """Deletes the rows of model whose id is greater than last_id"""
+    s = Session()
+    model.query().filter(model.id > last_id).delete(synchronize_session=False)
+    s.commit()
+    notify_changed(model)
+
+
+def run_size(n_rows, n_nutrients, seed, load_rows, db):
+    n_foods = max(1, n_rows // n_nutrients)
+    if db is not None and os.path.exists(db):
+        os.remove(db)
+    Session.remove()
+    engine = bind_engine('sqlite:///{}'.format(db) if db else 'sqlite://')
+    create_all()
+    counter = StatementCounter(engine)
+    foods, nutrients, amounts = generate(n_foods, n_nutrients, seed)
+    results = []
+
+    run_stage(results, 'bulk_load_dataframe', counter, lambda: (
+        Food.bulk_load_dataframe(foods),
+        Nutrient.bulk_load_dataframe(nutrients),
+        FoodNutrientAmount.bulk_load_dataframe(amounts)
+    ))
+    # row by row loading of amounts referring to their parents by name
+    sample = amounts.head(load_rows)
+    sample = sample.assign(**{
+        'food.name': 'food_' + sample.food_id.astype(str),
+        'nutrient.name': 'nutrient_' + sample.nutrient_id.astype(str)
+    }).drop(columns=['food_id', 'nutrient_id'])
+    last_id = Session().query(func.max(FoodNutrientAmount.id)).scalar() or 0
+    run_stage(results, 'load_dataframe', counter, FoodNutrientAmount.load_dataframe, sample)
+    # the later stages measure the generated rows only
+    delete_rows_after(FoodNutrientAmount, last_id)
+
+    run_stage(results, 'get_data_noindex', counter, Food.get_data, 'id')
+    run_stage(results, 'get_data_index', counter, Food.get_data, 'cost', 'id')
+    run_stage(
+        results, 'get_data_multiindex', counter,
+        FoodNutrientAmount.get_data, 'amount', ['food_id', 'nutrient_id']
+    )
+    run_stage(
+        results, 'get_data_numpy', counter,
+        FoodNutrientAmount.get_data, 'amount', ['food_id', 'nutrient_id'],
+        columnar='numpy'
+    )
+
+    problem = DietProblem('Diet')
+    problem.define_problem()
+    data = run_stage(results, 'problem_data', counter, lambda: problem.data)
+    run_stage(results, 'create_instance', counter, problem.create_instance, data=data)
+    run_stage(results, 'record_solve', counter, problem._record_solve, None)
+    run_stage(
+        results, 'as_dataframe', counter,
+        lambda: as_dataframe(FoodNutrientAmount.query())
+    )
+    engine.dispose()
+    return {
+        'rows': n_foods * n_nutrients,
+        'foods': n_foods,
+        'nutrients': n_nutrients,
+        'stages': results
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--nutrients', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--load-rows', type=int, default=1000)
+    parser.add_argument('--db', default=None, help='sqlite file, in memory if not given')
+    parser.add_argument('--output', default=None, help='json file, stdout if not given')
+    args = parser.parse_args(argv)
+    report = {
+        'python': platform.python_version(),
+        'seed': args.seed,
+        'runs': [
+            run_size(n, args.nutrients, args.seed, args.load_rows, args.db)
+            for n in args.rows
+        ]
+    }
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    failed = [
+        '{} ({} rows)'.format(stage['stage'], run['rows'])
+        for run in report['runs'] for stage in run['stages'] if 'error' in stage
+    ]
+    if failed:
+        sys.exit('Failed stages: {}'.format(', '.join(failed)))
+
+
+if __name__ == '__main__':
+    main()
@@ -7,7 +7,7 @@ class Food(ProblemRunMixin, Base):
     __tablename__ = 'foods'
 
     id = Column(Integer, primary_key=True)
-    name = Column(String)
+    name = Column(String, unique=True)
     cost = Column(Float)
     volume_per_serving = Column(Float)
     nutrient_amounts = relationship('FoodNutrientAmount')
@@ -21,6 +21,7 @@ class Food(ProblemRunMixin, Base):
 
 class FoodNutrientAmount(ProblemRunMixin, Base):
     __tablename__ = 'food_nutrient_amounts'
+    __parents__ = {'food': 'Food', 'nutrient': 'Nutrient'}
 
     id = Column(Integer, primary_key=True)
     food_id = Column(Integer, ForeignKey('foods.id'))
@@ -42,7 +43,7 @@ class Nutrient(ProblemRunMixin, Base):
     __tablename__ = 'nutrients'
 
     id = Column(Integer, primary_key=True)
-    name = Column(String)
+    name = Column(String, unique=True)
     lower_bound = Column(Float, nullable=True)
     upper_bound = Column(Float, nullable=True)
 
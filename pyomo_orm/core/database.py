@@ -1,9 +1,96 @@
-from sqlalchemy import create_engine
+import weakref
+
+import sqlalchemy
+from sqlalchemy import create_engine, select
 from sqlalchemy.orm import scoped_session, sessionmaker
 
 Session = scoped_session(sessionmaker())
 
+# SQLAlchemy 1.4 and 2.x take the columns of a select as arguments, and
+# keep the declarative class registry on the registry; 2.x drops the rest
+_SQLALCHEMY_14 = tuple(int(v) for v in sqlalchemy.__version__.split('.')[:2]) >= (1, 4)
+
+def select_columns(*columns):
+    """
+    Returns a SELECT of columns, for SQLAlchemy 1.3 to 2.x
+    """
+    if _SQLALCHEMY_14:
+        return select(*columns)
+    return select(list(columns))
+
+def class_registry(model):
+    """
+    Returns the declarative class registry of model, a dict of class name
+    to model class, for SQLAlchemy 1.3 to 2.x
+    """
+    if _SQLALCHEMY_14:
+        return model.registry._class_registry
+    return model._decl_class_registry
+
 def bind_engine(engine_url='sqlite://'):
     engine = create_engine(engine_url)
     Session.configure(bind=engine)
     return engine
+
+def dispose_inherited_engine():
+    """
+    Drops the session and pooled connections a forked process inherits from
+    its parent, so that it opens its own connections if it uses the database.
+    The parent's connections are left open for the parent.
+    """
+    Session.registry.clear()
+    engine = Session.session_factory.kw.get('bind')
+    if engine is None:
+        return
+    try:
+        engine.dispose(close=False)
+    except TypeError:
+        # SQLAlchemy < 1.4.33 closes the pooled connections
+        engine.dispose()
+
+_async_session_factory = None
+
+def bind_async_engine(engine_url='sqlite+aiosqlite://'):
+    """
+    Creates an async engine for async_session. Requires SQLAlchemy>=1.4 and
+    an async driver such as aiosqlite or asyncpg, installed with the async
+    extra: pip install pyomo-orm[async]
+    """
+    global _async_session_factory
+    try:
+        from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    except ImportError as e:
+        raise ImportError(
+            'bind_async_engine requires SQLAlchemy>=1.4, '
+            'install it with pip install pyomo-orm[async]'
+        ) from e
+    engine = create_async_engine(engine_url)
+    _async_session_factory = sessionmaker(
+        bind=engine,
+        class_=AsyncSession,
+        expire_on_commit=False
+    )
+    return engine
+
+def async_session():
+    """
+    Returns a new AsyncSession bound to the engine from bind_async_engine
+    """
+    if _async_session_factory is None:
+        raise RuntimeError('No async engine bound, call bind_async_engine first')
+    return _async_session_factory()
+
+
+_change_listeners = weakref.WeakSet()
+
+def add_change_listener(listener):
+    """
+    Registers listener to have listener.invalidate(model=model) called when
+    pyomo_orm writes to a model's table. Listeners are held weakly.
+    """
+    _change_listeners.add(listener)
+
+def notify_changed(*models):
+    for listener in list(_change_listeners):
+        for model in models:
+            listener.invalidate(model=model)
@@ -0,0 +1,121 @@
+"""
+Support for building problems as pyomo.kernel blocks, the opt-in backend of
+BaseProblem (set __backend__ = 'kernel').
+
+A kernel block holds plain containers of variables, constraints and
+objectives rather than indexed environ components, so large instances take
+less memory and are quicker to build. There are no kernel sets or constant
+params: sets are kept on the block as lists of their members and params as
+ParamValues, dicts of their values.
+
+The helpers here let the rest of pyomo_orm treat environ models and kernel
+blocks alike.
+"""
+import itertools
+
+from pyomo.core.kernel.base import ICategorizedObject
+from pyomo.core.kernel.constraint import IConstraint
+from pyomo.core.kernel.objective import IObjective
+from pyomo.core.kernel.variable import IVariable, variable
+from pyomo.environ import Constraint, Objective, Param, Var
+
+KERNEL_CTYPES = {Var: IVariable, Constraint: IConstraint, Objective: IObjective}
+
+
+def is_kernel(obj):
+    """
+    Returns True if obj is a pyomo.kernel block or container
+    """
+    return isinstance(obj, ICategorizedObject)
+
+
+class ParamValues(dict):
+    """
+    The values of an indexed param on a kernel block. Indices that have no
+    value take the param's default, if it has one.
+    """
+    def __init__(self, data, default=Param.NoValue):
+        super().__init__(data)
+        self.default = default
+
+    def __missing__(self, key):
+        if self.default is Param.NoValue:
+            raise KeyError(key)
+        return self.default
+
+
+def product_index(sets):
+    """
+    Returns an iterator of the indices of a component indexed by sets, as
+    environ indexes it: the members of a single set, or the tuples of the
+    product of several with the members of tuple sets flattened
+    """
+    if len(sets) == 1:
+        return iter(sets[0])
+    if not any(s and isinstance(s[0], tuple) for s in sets):
+        return itertools.product(*sets)
+    return (
+        tuple(itertools.chain.from_iterable(
+            k if isinstance(k, tuple) else (k,) for k in keys
+        )) for keys in itertools.product(*sets)
+    )
+
+
+def rule_args(index):
+    """
+    Returns the args after the block that a rule is called with for index
+    """
+    return index if isinstance(index, tuple) else (index,)
+
+
+def variable_kwargs(kwargs):
+    """
+    Returns the kwargs of a kernel variable for those of an environ Var. A
+    within domain, bounds tuple and constant initialize are translated;
+    other kwargs are passed on as they are.
+    """
+    kwargs = dict(kwargs)
+    kwargs.pop('dense', None)
+    if 'within' in kwargs:
+        kwargs['domain'] = kwargs.pop('within')
+    if 'bounds' in kwargs:
+        kwargs['lb'], kwargs['ub'] = kwargs.pop('bounds')
+    if 'initialize' in kwargs:
+        kwargs['value'] = kwargs.pop('initialize')
+    if 'domain' in kwargs and ('lb' in kwargs or 'ub' in kwargs):
+        # a kernel variable takes either a domain or bounds: combine them
+        domain = variable(domain=kwargs.pop('domain'))
+        kwargs['domain_type'] = domain.domain_type
+        kwargs['lb'] = _tightest(max, domain.lb, kwargs.get('lb'))
+        kwargs['ub'] = _tightest(min, domain.ub, kwargs.get('ub'))
+    return kwargs
+
+
+def _tightest(pick, *bounds):
+    bounds = [b for b in bounds if b is not None]
+    return pick(bounds) if bounds else None
+
+
+def data_objects(instance, ctype, active=True):
+    """
+    Returns an iterator of the vars, constraints or objectives (ctype is the
+    environ Var, Constraint or Objective) of an environ model or kernel
+    block. With active, only active constraints and objectives.
+    """
+    if not is_kernel(instance):
+        return instance.component_data_objects(ctype, active=active)
+    if ctype is Var:
+        active = None
+    return instance.components(ctype=KERNEL_CTYPES[ctype], active=active or None)
+
+
+def extract_values(var):
+    """
+    Returns a dict of the index to value of each entry of an environ Var or
+    kernel variable container; a single variable has the index None
+    """
+    if not is_kernel(var):
+        return var.extract_values()
+    if isinstance(var, variable):
+        return {None: var.value}
+    return {k: v.value for k, v in var.items()}
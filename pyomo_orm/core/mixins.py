@@ -1,5 +1,69 @@
+import math
+from array import array
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
 from pyomo.environ import Set, Param, Var
-from .database import Session
+from sqlalchemy import and_, bindparam, or_
+from sqlalchemy.orm import aliased
+
+from .database import Session, async_session, class_registry, notify_changed
+from .schema import schema_graph, set_index
+
+
+class LazyModelIds:
+    """
+    The ids of the rows in a queryset of model. They are fetched with a
+    scalar SELECT id the first time they are used and stored in an
+    array('q'). Components created from the same queryset can share one
+    LazyModelIds.
+    """
+    def __init__(self, model, queryset=None):
+        self.model = model
+        self.queryset = queryset
+        self._ids = None
+
+    @property
+    def ids(self):
+        if self._ids is None:
+            queryset = self.queryset
+            if queryset is None:
+                queryset = self.model.query()
+            self._ids = array('q', (i for (i,) in queryset.with_entities(self.model.id)))
+        return self._ids
+
+    def reset(self):
+        """
+        Discards the fetched ids so they are fetched again on next use
+        """
+        self._ids = None
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __deepcopy__(self, memo):
+        # instances cloned from an abstract model share its ids; the
+        # queryset's session can't be copied
+        return self
+
+    async def aids(self):
+        """
+        Async version of ids, fetching with async_session
+        """
+        if self._ids is None:
+            queryset = self.queryset
+            if queryset is None:
+                queryset = self.model.query()
+            statement = queryset.with_entities(self.model.id).statement
+            async with async_session() as s:
+                result = await s.execute(statement)
+                self._ids = array('q', (i for (i,) in result))
+        return self._ids
 
 
 class BaseModelMixin:
@@ -8,46 +72,51 @@ class BaseModelMixin:
     """
 
     @classmethod
-    def create_set(cls, from_attr='id', indexed_by=None, queryset=None, **kwargs):
+    def create_set(cls, from_attr='id', indexed_by=None, queryset=None, model_ids=None, **kwargs):
         s = Set(**kwargs)
         s._model = cls
         s._from_attr = from_attr
         s._indexed_by = indexed_by
-        if queryset is None:
-            queryset = cls.query()
-        s._model_ids = [x.id for x in queryset.all()]
+        s._model_ids = cls._lazy_model_ids(queryset, model_ids)
         return s
 
     @classmethod
-    def create_param(cls, *index_sets, from_attr='id', indexed_by=None, queryset=None, **kwargs):
+    def create_param(cls, *index_sets, from_attr='id', indexed_by=None, queryset=None, model_ids=None, **kwargs):
         p = Param(*index_sets, **kwargs)
         p._from_attr = from_attr
         p._indexed_by = indexed_by
         p._model = cls
-        if queryset is None:
-            queryset = cls.query()
-        p._model_ids = [x.id for x in queryset.all()]
+        p._model_ids = cls._lazy_model_ids(queryset, model_ids)
         return p
 
     @classmethod
-    def create_var(cls, *index_sets, from_attr='id', indexed_by=None, queryset=None, **kwargs):
+    def create_var(cls, *index_sets, from_attr='id', indexed_by=None, queryset=None, model_ids=None, **kwargs):
         v = Var(*index_sets, **kwargs)
         v._from_attr = from_attr
         v._indexed_by = indexed_by
         v._model = cls
-        if queryset is None:
-            queryset = cls.query()
-        v._model_ids = [x.id for x in queryset.all()]
+        v._model_ids = cls._lazy_model_ids(queryset, model_ids)
         return v
 
+    @classmethod
+    def _lazy_model_ids(cls, queryset=None, model_ids=None):
+        """
+        Returns model_ids if given, otherwise a new LazyModelIds for queryset
+        """
+        if model_ids is not None:
+            return model_ids
+        return LazyModelIds(cls, queryset)
+
     @classmethod
     def infer_index_set(cls, pyomo_model, indexed_by):
         """
         Returns a list of pyomo sets attached to pyomo_model that
-        were created by pyomo-orm and match the indexed_by columns
+        were created by pyomo-orm and match the indexed_by columns. A
+        relationship path such as 'food.name' matches the sets created from
+        the name column of the related model.
         """
         dispatcher = {
-            type(None): lambda x: [],
+            type(None): lambda pyomo_model, indexed_by: [],
             str: cls._infer_index_set,
             tuple: cls._infer_multiindex_set,
             list: cls._infer_multiindex_set
@@ -62,12 +131,7 @@ class BaseModelMixin:
 
         Assumes indexed_by is a string
         """
-        inferred_sets = []
-        orm_created_sets = [c for c in pyomo_model.component_objects() if hasattr(c, '_model') and isinstance(c, Set)]
-        for s in orm_created_sets:
-            if s._model == cls and s._from_attr == indexed_by:
-                inferred_sets.append(s)
-        return inferred_sets
+        return set_index(pyomo_model).lookup(cls._resolve_path(indexed_by))
 
     @classmethod
     def _infer_multiindex_set(cls, pyomo_model, indexed_by):
@@ -76,60 +140,486 @@ class BaseModelMixin:
         pyomo-orm that match the column of each element in the 'indexed_by' tuple,
         following foreign keys if present
         """
+        sets = set_index(pyomo_model)
+        graph = cls.schema_graph()
         inferred_sets = []
-        orm_created_sets = [c for c in pyomo_model.component_objects() if hasattr(c, '_model') and isinstance(c, Set)]
         for ind in indexed_by:
-            for s in orm_created_sets:
-                if s._model == cls and s._from_attr == ind:
-                    inferred_sets.append(s)
-                for fk in getattr(cls.__table__.c, ind).foreign_keys:
-                    tablename = fk.target_fullname.split('.')[0]
-                    column_name = fk.target_fullname.split('.')[1]
-                    model = cls.get_class_by_tablename(tablename)
-                    if s._model == model and s._from_attr == column_name:
-                        inferred_sets.append(s)
+            model, attr = cls._resolve_path(ind)
+            inferred_sets.extend(sets.lookup((model, attr), *graph.targets(model, attr)))
         return inferred_sets
 
     @classmethod
-    def get_data(cls, from_attr='id', indexed_by=None, queryset=None):
+    def schema_graph(cls):
+        """
+        Returns the SchemaGraph of the models in cls's declarative registry:
+        the tables and foreign keys between them, for set inference and join
+        planning
+        """
+        return schema_graph(class_registry(cls))
+
+    @classmethod
+    def get_data(cls, from_attr='id', indexed_by=None, queryset=None, columnar=None,
+                 default=None, chunk_size=None):
+        """
+        Returns the data in the from_attr column, indexed by the indexed_by
+        column(s), as a dictionary suitable for pyomo's create_instance.
+
+        Only the indexed_by and from_attr columns are selected; the rows are
+        never loaded as ORM objects. Any filters on queryset are kept. Rows
+        whose from_attr is NULL, or equal to default if given (e.g. the
+        default of a sparse Param), are left out by the query.
+
+        Columns of related models can be given as dotted relationship paths,
+        e.g. indexed_by=('food.name', 'nutrient.name'). They are joined in
+        the same query; rows without the related object are left out.
+
+        If columnar is 'numpy' or 'pandas' the selected columns are returned
+        as a dict of numpy arrays or a pandas DataFrame instead.
+
+        If from_attr is a tuple of columns (and indexed_by is None) the
+        result is the distinct tuples of those columns' values, for a
+        multi-dimensional Set of the combinations that occur in the rows.
+
+        If chunk_size (or the model's __fetch_chunk_size__) is set, the rows
+        are streamed from the database that many at a time (yield_per) and
+        the result is filled chunk by chunk, so the full result set is never
+        held in memory alongside the result.
+        """
         if queryset is None:
             queryset=cls.query()
+        chunk_size = cls._fetch_chunk_size(chunk_size)
+        if columnar is not None:
+            return cls._get_data_columnar(
+                from_attr, indexed_by, queryset, columnar, default, chunk_size
+            )
+        if chunk_size is not None:
+            queryset = queryset.yield_per(chunk_size)
+        if not isinstance(from_attr, str):
+            return cls._get_data_tuples(from_attr, indexed_by, queryset)
         dispatcher = {
             type(None): cls._get_data_noindex,
             str: cls._get_data_index,
             tuple: cls._get_data_multiindex,
             list: cls._get_data_multiindex
         }
-        return dispatcher[type(indexed_by)](from_attr, indexed_by, queryset)
+        return dispatcher[type(indexed_by)](from_attr, indexed_by, queryset, default)
 
     @classmethod
-    def _get_data_noindex(cls, from_attr, indexed_by, queryset):
-        if queryset.filter(getattr(cls, from_attr) != None).count() > 1:
-            di = {None: [getattr(m, from_attr) for m in queryset.filter(getattr(cls, from_attr) != None).all()]}
+    def set_data(cls, data, from_attr, indexed_by='id', values=None, batch_size=10000):
+        """
+        The inverse of get_data. Writes the values of the data dictionary to
+        the from_attr column of the rows whose indexed_by column(s) match its
+        keys, with executemany UPDATEs of batch_size rows in a single
+        transaction. ORM objects are not loaded.
+
+        Arguments:
+            *values* a dict of further column names and values to set on every
+            updated row
+        """
+        index_attrs = cls._index_attrs(indexed_by)
+        if not index_attrs:
+            raise ValueError('set_data requires indexed_by column(s)')
+        columns = cls.__mapper__.columns
+        statement = cls.__table__.update().where(
+            and_(*[
+                columns[a] == bindparam('_index_{}'.format(n))
+                for n, a in enumerate(index_attrs)
+            ])
+        )
+        if values:
+            statement = statement.values(
+                **{columns[k].key: v for k, v in values.items()}
+            )
+        value_key = columns[from_attr].key
+        if len(index_attrs) == 1:
+            params = [{'_index_0': k, value_key: v} for k, v in data.items()]
         else:
-            di = {None: getattr(m, from_attr) for m in queryset.filter(getattr(cls, from_attr) != None).all()}
-        return di
+            params = [
+                dict(
+                    {'_index_{}'.format(n): i for n, i in enumerate(k)},
+                    **{value_key: v}
+                ) for k, v in data.items()
+            ]
+        s = Session()
+        try:
+            for start in range(0, len(params), batch_size):
+                s.execute(statement, params[start:start + batch_size])
+            s.commit()
+        except Exception:
+            s.rollback()
+            raise
+        notify_changed(cls)
 
     @classmethod
-    def _get_data_index(cls, from_attr, indexed_by, queryset):
-        di = dict(
-            [
-                (
-                    getattr(m, indexed_by),
-                    getattr(m, from_attr)
-                ) for m in queryset.all() if getattr(m, from_attr) is not None
-            ]
+    def _project(cls, queryset, *attrs, present=()):
+        """
+        Returns queryset selecting only the columns named in attrs, outer
+        joining the relationships of any dotted paths. If present, a list of
+        (attr, default, indexed_by) triples, only rows where at least one of
+        those attrs has a value (see _present), and each of its dotted
+        indexed_by paths is not NULL, are selected. attr may be a tuple of
+        columns, all of which must have a value.
+        """
+        columns, joins = cls._resolve_columns(attrs)
+        for join in joins:
+            queryset = queryset.outerjoin(join)
+        if present:
+            column_of = dict(zip(attrs, columns))
+            conditions = []
+            for a, default, indexed_by in present:
+                if isinstance(a, str):
+                    condition = [cls._present(column_of[a], default)]
+                else:
+                    condition = [cls._present(column_of[c]) for c in a]
+                condition.extend(
+                    column_of[c] != None
+                    for c in cls._related_attrs(cls._index_attrs(indexed_by))
+                )
+                conditions.append(and_(*condition))
+            queryset = queryset.filter(or_(*conditions))
+        return queryset.with_entities(*columns)
+
+    @classmethod
+    def _present(cls, column, default=None):
+        """
+        Returns the SQL condition that column is not NULL and, if default
+        can be compared in SQL, not default
+        """
+        if cls._sql_default(default):
+            return and_(column != None, column != default)
+        return column != None
+
+    @staticmethod
+    def _sql_default(default):
+        """
+        Whether rows equal to default can be left out by the query. Other
+        defaults (None, infinities, rules) are left out in Python.
+        """
+        if isinstance(default, float):
+            return math.isfinite(default)
+        return isinstance(default, (int, str))
+
+    @classmethod
+    def _drop_defaults(cls, rows, default):
+        """
+        Leaves out the rows whose value, the last column, is default where
+        the query could not
+        """
+        if default is None or cls._sql_default(default):
+            return rows
+        return (r for r in rows if r[-1] != default)
+
+    @classmethod
+    def _resolve_columns(cls, attrs):
+        """
+        Returns the column of each of attrs, which may be dotted relationship
+        paths, and the relationships to join, in order, to select them. Each
+        distinct path is joined once, to its own alias.
+
+        The joins are outer joins: get_data_many selects the columns of
+        several components at once, and a path joined for one of them must
+        not leave out the rows of the others. Rows without the related
+        object are left out per component instead.
+        """
+        entities = {(): cls}
+        joins = []
+        columns = []
+        for attr in attrs:
+            path = tuple(attr.split('.'))
+            for n in range(1, len(path)):
+                if path[:n] not in entities:
+                    relationship = getattr(entities[path[:n - 1]], path[n - 1])
+                    alias = aliased(relationship.property.mapper.class_)
+                    joins.append(relationship.of_type(alias))
+                    entities[path[:n]] = alias
+            columns.append(getattr(entities[path[:-1]], path[-1]))
+        return columns, joins
+
+    @classmethod
+    def _resolve_path(cls, attr):
+        """
+        Returns the (model, column name) that attr, which may be a dotted
+        relationship path, refers to
+        """
+        *relationships, name = attr.split('.')
+        model = cls
+        for relationship in relationships:
+            model = model.__mapper__.relationships[relationship].mapper.class_
+        return model, name
+
+    @classmethod
+    def related_models(cls, *attrs):
+        """
+        Returns a tuple of cls and the models joined to select attrs, which
+        may be dotted relationship paths
+        """
+        models = [cls]
+        for attr in attrs:
+            *relationships, _ = attr.split('.')
+            model = cls
+            for relationship in relationships:
+                model = model.__mapper__.relationships[relationship].mapper.class_
+                if model not in models:
+                    models.append(model)
+        return tuple(models)
+
+    @staticmethod
+    def _related_attrs(attrs):
+        """
+        Returns the dotted relationship paths among the column names attrs
+        """
+        return [a for a in attrs if '.' in a]
+
+    @staticmethod
+    def _value_attrs(from_attr):
+        """
+        Returns the from_attr column(s) as a list of column names
+        """
+        if from_attr is None:
+            return []
+        elif isinstance(from_attr, str):
+            return [from_attr]
+        return list(from_attr)
+
+    @classmethod
+    def _index_attrs(cls, indexed_by):
+        """
+        Returns the indexed_by column(s) as a list of column names
+        """
+        if indexed_by is None:
+            return []
+        elif isinstance(indexed_by, str):
+            return [indexed_by]
+        return list(indexed_by)
+
+    @classmethod
+    def _fetch_chunk_size(cls, chunk_size=None):
+        """
+        Returns chunk_size, or the model's __fetch_chunk_size__ if it is None
+        """
+        if chunk_size is None:
+            return cls.__fetch_chunk_size__
+        return chunk_size
+
+    @staticmethod
+    def _chunks(rows, chunk_size):
+        """
+        Yields lists of up to chunk_size of rows
+        """
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    @classmethod
+    def get_data_many(cls, specs, queryset=None, chunk_size=None, row_counter=None):
+        """
+        Returns a list of the get_data results for each (from_attr, indexed_by)
+        or (from_attr, indexed_by, default) in specs, fetched with a single
+        query selecting the union of their columns. Only rows with a value
+        for at least one of the specs are selected. Rows are streamed as in
+        get_data if chunk_size is set. row_counter, if given, is called with
+        the number of rows of each chunk fetched.
+        """
+        queryset, position = cls._project_many(specs, queryset)
+        chunk_size = cls._fetch_chunk_size(chunk_size)
+        if chunk_size is None:
+            chunks = [queryset.all()]
+        else:
+            chunks = cls._chunks(queryset.yield_per(chunk_size), chunk_size)
+        return cls._split_chunks(chunks, position, specs, row_counter)
+
+    @classmethod
+    async def aget_data(cls, from_attr='id', indexed_by=None, queryset=None, default=None,
+                        columnar=None):
+        """
+        Async version of get_data, executed with async_session
+        """
+        if columnar is None:
+            return (await cls.aget_data_many([(from_attr, indexed_by, default)], queryset))[0]
+        if queryset is None:
+            queryset = cls.query()
+        attrs = cls._columnar_attrs(from_attr, indexed_by, columnar)
+        queryset = cls._project(queryset, *attrs, present=[(from_attr, default, indexed_by)])
+        async with async_session() as s:
+            rows = (await s.execute(queryset.statement)).all()
+        return cls._columnar_result(rows, attrs, from_attr, columnar, default)
+
+    @classmethod
+    async def aget_data_many(cls, specs, queryset=None, row_counter=None):
+        """
+        Async version of get_data_many, executed with async_session
+        """
+        queryset, position = cls._project_many(specs, queryset)
+        async with async_session() as s:
+            rows = (await s.execute(queryset.statement)).all()
+        return cls._split_chunks([rows], position, specs, row_counter)
+
+    @classmethod
+    def _project_many(cls, specs, queryset=None):
+        """
+        Returns queryset selecting the union of the columns of specs, as
+        given to get_data_many, and a dict mapping each column name to its
+        place in a row
+        """
+        if queryset is None:
+            queryset = cls.query()
+        attrs = []
+        present = []
+        for from_attr, indexed_by, *default in specs:
+            attrs.extend(cls._index_attrs(indexed_by))
+            attrs.extend(cls._value_attrs(from_attr))
+            present.append((from_attr, default[0] if default else None, indexed_by))
+        attrs = list(dict.fromkeys(attrs))
+        position = {a: i for i, a in enumerate(attrs)}
+        return cls._project(queryset, *attrs, present=present), position
+
+    @classmethod
+    def _split_chunks(cls, chunks, position, specs, row_counter=None):
+        """
+        Builds the get_data dictionary for each of specs from the chunks of
+        rows selected by get_data_many, one chunk at a time. position maps
+        column names to their place in a row.
+        """
+        data = [[] if spec[1] is None else {} for spec in specs]
+        for rows in chunks:
+            if row_counter is not None:
+                row_counter(len(rows))
+            for d, spec in zip(data, specs):
+                cls._collect_rows(d, rows, position, *spec)
+        return [cls._finish_data(d, *spec[:2]) for d, spec in zip(data, specs)]
+
+    @classmethod
+    def _collect_rows(cls, data, rows, position, from_attr, indexed_by, default=None):
+        """
+        Adds the entries of one component in rows to data: a list of values
+        if indexed_by is None, otherwise a dict
+        """
+        if not isinstance(from_attr, str):
+            vs = [position[a] for a in from_attr]
+            values = (tuple(r[i] for i in vs) for r in rows)
+            data.extend(t for t in values if None not in t)
+            return
+        v = position[from_attr]
+        if default is None:
+            rows = (r for r in rows if r[v] is not None)
+        else:
+            rows = (r for r in rows if r[v] is not None and r[v] != default)
+        related = [position[a] for a in cls._related_attrs(cls._index_attrs(indexed_by))]
+        if related:
+            rows = (r for r in rows if all(r[i] is not None for i in related))
+        if indexed_by is None:
+            data.extend(r[v] for r in rows)
+        elif isinstance(indexed_by, str):
+            i = position[indexed_by]
+            data.update((r[i], r[v]) for r in rows)
+        else:
+            ind = [position[a] for a in indexed_by]
+            data.update((tuple(r[i] for i in ind), r[v]) for r in rows)
+
+    @classmethod
+    def _finish_data(cls, data, from_attr, indexed_by):
+        """
+        Returns the get_data dictionary of data collected by _collect_rows
+        """
+        if indexed_by is not None:
+            return data
+        if not isinstance(from_attr, str):
+            return {None: list(dict.fromkeys(data))}
+        return cls._noindex_data(data)
+
+    @staticmethod
+    def _noindex_data(values):
+        """
+        Returns the get_data dictionary of an unindexed component's values
+        """
+        if len(values) > 1:
+            return {None: values}
+        return {None: v for v in values}
+
+    @classmethod
+    def _get_data_tuples(cls, from_attr, indexed_by, queryset):
+        if indexed_by is not None:
+            raise ValueError('A tuple of from_attr columns can\'t be indexed_by')
+        rows = cls._project(queryset, *from_attr, present=[(from_attr, None, None)]).distinct()
+        return {None: [tuple(r) for r in rows]}
+
+    @classmethod
+    def _get_data_noindex(cls, from_attr, indexed_by, queryset, default=None):
+        rows = cls._project(queryset, from_attr, present=[(from_attr, default, None)])
+        return cls._noindex_data([v for (v,) in cls._drop_defaults(rows, default)])
+
+    @classmethod
+    def _get_data_index(cls, from_attr, indexed_by, queryset, default=None):
+        rows = cls._project(
+            queryset, indexed_by, from_attr, present=[(from_attr, default, indexed_by)]
         )
+        di = {i: v for i, v in cls._drop_defaults(rows, default)}
         return di
 
     @classmethod
-    def _get_data_multiindex(cls, from_attr, indexed_by, queryset):
-        di = dict(
-            [
-                (
-                    tuple([getattr(m, ind) for ind in indexed_by]),
-                    getattr(m, from_attr)
-                ) for m in queryset.all() if getattr(m, from_attr) is not None
-            ]
+    def _get_data_multiindex(cls, from_attr, indexed_by, queryset, default=None):
+        rows = cls._project(
+            queryset, *indexed_by, from_attr, present=[(from_attr, default, indexed_by)]
         )
+        di = {tuple(r[:-1]): r[-1] for r in cls._drop_defaults(rows, default)}
         return di
+
+    @classmethod
+    def _columnar_attrs(cls, from_attr, indexed_by, columnar):
+        """
+        Returns the columns selected for a columnar result, checking columnar
+        """
+        if columnar not in ('numpy', 'pandas'):
+            raise ValueError(
+                'columnar must be one of None, \'numpy\' or \'pandas\', not {}'.format(
+                    repr(columnar)
+                )
+            )
+        attrs = cls._index_attrs(indexed_by) + cls._value_attrs(from_attr)
+        # a column may be both an index and the value, e.g. sets of ids
+        return list(dict.fromkeys(attrs))
+
+    @classmethod
+    def _columnar_result(cls, rows, attrs, from_attr, columnar, default=None):
+        """
+        Returns rows of the attrs columns as a pandas DataFrame or a dict of
+        numpy arrays
+        """
+        df = pd.DataFrame.from_records(rows, columns=attrs)
+        if default is not None and not cls._sql_default(default):
+            df = df[df[from_attr] != default].reset_index(drop=True)
+        if columnar == 'pandas':
+            return df
+        return {a: df[a].to_numpy() for a in attrs}
+
+    @classmethod
+    def _get_data_columnar(cls, from_attr, indexed_by, queryset, columnar, default=None,
+                           chunk_size=None):
+        """
+        Returns the indexed_by and from_attr columns of queryset as a pandas
+        DataFrame (columnar='pandas') or a dict of numpy arrays
+        (columnar='numpy'), keyed by column name. If chunk_size is set the
+        arrays are built from the rows chunk_size at a time.
+        """
+        attrs = cls._columnar_attrs(from_attr, indexed_by, columnar)
+        queryset = cls._project(queryset, *attrs, present=[(from_attr, default, indexed_by)])
+        if chunk_size is None:
+            return cls._columnar_result(queryset.all(), attrs, from_attr, columnar, default)
+        parts = {a: [] for a in attrs}
+        for chunk in cls._chunks(queryset.yield_per(chunk_size), chunk_size):
+            for a, column in zip(attrs, zip(*chunk)):
+                parts[a].append(np.array(column))
+        # concatenate one column at a time, freeing its parts
+        columns = {}
+        for a in attrs:
+            p = parts.pop(a)
+            columns[a] = np.concatenate(p) if p else np.array([])
+        if default is not None and not cls._sql_default(default):
+            keep = columns[from_attr] != default
+            columns = {a: c[keep] for a, c in columns.items()}
+        if columnar == 'pandas':
+            return pd.DataFrame(columns, columns=attrs)
+        return columns
@@ -1,4 +1,6 @@
-from .base import create_all, Base
-from .runs import ProblemRun, ProblemDetail, ProblemRunMixin
+from .base import create_all, upgrade_schema, Base
+from .runs import (ProblemRun, ProblemRunMetric, ProblemRunMembership,
+                   ProblemDetail, ProblemRunMixin)
 
-__all__ = ['create_all', 'ProblemRun', 'ProblemDetail']
+__all__ = ['create_all', 'upgrade_schema', 'ProblemRun', 'ProblemRunMetric',
+    'ProblemRunMembership', 'ProblemDetail']
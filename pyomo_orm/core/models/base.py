@@ -1,10 +1,26 @@
-from sqlalchemy.ext.declarative import declarative_base
+import logging
+
+import pandas as pd
+from sqlalchemy import bindparam, inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateColumn
+try:
+    from sqlalchemy.orm import declarative_base
+except ImportError:
+    # SQLAlchemy < 1.4
+    from sqlalchemy.ext.declarative import declarative_base
 
 from pyomo_orm.core.mixins import BaseModelMixin
-from pyomo_orm.core.database import Session
+from pyomo_orm.core.database import Session, class_registry, notify_changed, select_columns
 from pyomo_orm.core.exc import ModelDoesNotExist
 
 class DeclarativeBase:
+    __parents__ = {}
+    __csv_parsers__ = {}
+    __fingerprint_columns__ = ('id',)
+    __updated_at_column__ = None
+    __fetch_chunk_size__ = None
+
     def __validate__(self):
         """Run all methods which start with validate"""
         methlist = [x for x in dir(type(self)) if callable(getattr(self, x))]
@@ -18,7 +34,9 @@ class DeclarativeBase:
         s = Session()
         try:
             s.add(self)
-            return s.commit()
+            ret = s.commit()
+            notify_changed(type(self))
+            return ret
         except IntegrityError as e:
             raise IntegrityError(
                 'Couldn\'t save object {0}: {1}'.format(
@@ -32,7 +50,9 @@ class DeclarativeBase:
     def delete(self):
         s = Session()
         s.delete(self)
-        return s.commit()
+        ret = s.commit()
+        notify_changed(type(self))
+        return ret
 
     @classmethod
     def get(cls, **kwargs):
@@ -83,15 +103,11 @@ class DeclarativeBase:
 
     @classmethod
     def _create_from_csv_row(cls, row_data):
-        module = __import__('nemzord')
         r_dict = {}
         for k, v in row_data.to_dict().items():
             if '.' in k:
                 key = k.split('.')[0]
-                class_ = getattr(
-                    module.models,
-                    cls.__parents__[key]
-                )
+                class_ = cls._get_parent_class(key)
                 col = k.split('.')[1]
                 val = class_.query().filter_by(**{col: v}).first()
             elif k in cls.__csv_parsers__.keys():
@@ -108,18 +124,139 @@ class DeclarativeBase:
         logging.debug('Made {0} instance with {1}'.format(str(cls), str(r_dict)))
         return model_instance
 
+    @classmethod
+    def bulk_load_csv(cls, filename, chunksize=10000, upsert_on=None):
+        """
+        Bulk version of load_csv. The csv is read in chunks of chunksize rows
+        and each chunk is loaded with bulk_load_dataframe, see there for
+        details.
+        """
+        lookups = {}
+        for chunk in pd.read_csv(filename, chunksize=chunksize):
+            cls._bulk_load_chunk(chunk, lookups, upsert_on)
+
+    @classmethod
+    def bulk_load_dataframe(cls, dataframe, batch_size=10000, upsert_on=None):
+        """
+        Bulk version of load_dataframe, accepting the same columns.
+
+        Rather than saving one model instance per row, every
+        ``parent.column`` heading is resolved with one lookup query per parent,
+        ``__csv_parsers__`` are applied a column at a time and rows are inserted
+        with executemany, committing once per batch_size rows. Model
+        validators are not run.
+
+        Arguments:
+            *upsert_on* a list of column names identifying existing rows. If
+            given, rows matching an existing row on these columns update it
+            instead of being inserted.
+        """
+        lookups = {}
+        for start in range(0, len(dataframe), batch_size):
+            cls._bulk_load_chunk(
+                dataframe.iloc[start:start + batch_size],
+                lookups,
+                upsert_on
+            )
+
+    @classmethod
+    def _bulk_load_chunk(cls, dataframe, lookups, upsert_on=None):
+        """
+        Converts dataframe to table rows and writes them in one transaction.
+        lookups caches the parent lookup maps between chunks.
+        """
+        columns = {}
+        for k in dataframe.columns:
+            if '.' in k:
+                key, col = k.split('.')
+                if k not in lookups:
+                    lookups[k] = cls._parent_lookup(key, col)
+                fk_column, lookup = lookups[k]
+                columns[fk_column] = dataframe[k].map(lookup)
+            elif k in cls.__csv_parsers__.keys():
+                columns[k] = dataframe[k].map(cls.__csv_parsers__[k])
+            else:
+                columns[k] = dataframe[k]
+        df = pd.DataFrame(columns).astype(object)
+        records = df.where(pd.notnull(df), None).to_dict('records')
+        if not records:
+            return
+        s = Session()
+        try:
+            if upsert_on is not None:
+                records = cls._bulk_update_existing(s, records, upsert_on)
+            if records:
+                s.execute(cls.__table__.insert(), records)
+            s.commit()
+        except Exception:
+            s.rollback()
+            raise
+        notify_changed(cls)
+        logging.debug('Bulk loaded {0} rows into {1}'.format(len(df), str(cls)))
+
+    @classmethod
+    def _parent_lookup(cls, name, column):
+        """
+        Returns the name of the foreign key column for the parent relationship
+        name, and a dict mapping values of the parent's column to the key
+        """
+        relationship = cls.__mapper__.relationships[name]
+        local, remote = relationship.local_remote_pairs[0]
+        parent = cls._get_parent_class(name)
+        rows = parent.query().with_entities(getattr(parent, column), remote)
+        return local.key, dict(rows)
+
+    @classmethod
+    def _bulk_update_existing(cls, session, records, upsert_on):
+        """
+        Updates the rows of the table matching records on the upsert_on
+        columns with executemany and returns the records that did not match
+        """
+        table = cls.__table__
+        pk = table.primary_key.columns.values()[0]
+        keys = [table.c[c] for c in upsert_on]
+        candidates = set(r[upsert_on[0]] for r in records)
+        existing = dict(
+            (tuple(row[:-1]), row[-1]) for row in session.execute(
+                select_columns(*keys, pk).where(keys[0].in_(candidates))
+            )
+        )
+        updates, inserts = [], []
+        for r in records:
+            match = existing.get(tuple(r[c] for c in upsert_on))
+            if match is None:
+                inserts.append(r)
+            else:
+                updates.append(dict(r, _pk=match))
+        if updates:
+            session.execute(
+                table.update().where(pk == bindparam('_pk')),
+                updates
+            )
+        return inserts
+
+    @classmethod
+    def _get_parent_class(cls, name):
+        """
+        Returns the model class of the parent name in ``__parents__``. Parents
+        may be given as classes or as class names in the declarative registry.
+        """
+        parent = cls.__parents__[name]
+        if isinstance(parent, str):
+            return class_registry(cls)[parent]
+        return parent
+
     @classmethod
     def csv_info(cls):
         """
         Return information about the required csv format
         """
-        module = __import__('nemzord')
         descriptions = []
         for column in [x for x in cls.__table__.columns if x.primary_key is False]:
             this_description = '{0} ({1})'.format(column.key, str(column.type))
             for fk in column.foreign_keys:
-                for name, model in cls.__parents__.items():
-                    model_cls = getattr(module.models, model)
+                for name in cls.__parents__:
+                    model_cls = cls._get_parent_class(name)
                     if fk.references(model_cls.__table__):
                         for c in model_cls._get_unique_columns():
                             this_description += '|{0}.{1} ({2})'.format(
@@ -144,12 +281,45 @@ class DeclarativeBase:
         """
         Return class reference mapped to tablename
         """
-        for c in cls._decl_class_registry.values():
-            if hasattr(c, '__tablename__') and c.__tablename__ == tablename:
-                return c
+        return cls.schema_graph().model_for(tablename)
 
 Base = declarative_base(cls=(BaseModelMixin, DeclarativeBase))
 
 def create_all():
     s = Session()
     Base.metadata.create_all(s.connection())
+
+def upgrade_schema():
+    """
+    Brings the tables of a database created by an earlier version up to date
+    with the models: adds the columns and indexes missing from existing
+    tables with ALTER TABLE and CREATE INDEX, then creates the missing
+    tables. Added columns must be nullable or have a server default.
+
+    Returns: list of the DDL statements executed for existing tables
+    """
+    s = Session()
+    conn = s.connection()
+    inspector = inspect(conn)
+    existing = set(inspector.get_table_names())
+    executed = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        columns = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                ddl = 'ALTER TABLE {} ADD COLUMN {}'.format(
+                    table.name,
+                    CreateColumn(column).compile(dialect=conn.dialect)
+                )
+                conn.execute(text(ddl))
+                executed.append(ddl)
+        indexes = {i['name'] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(conn)
+                executed.append('CREATE INDEX {}'.format(index.name))
+    Base.metadata.create_all(conn)
+    s.commit()
+    return executed
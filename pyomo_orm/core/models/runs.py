@@ -1,8 +1,16 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+import datetime
+
+import numpy as np
+from sqlalchemy import Column, DateTime, Float, Index, Integer, String, ForeignKey
 from sqlalchemy.orm import relationship
-from sqlalchemy.ext.declarative import declared_attr
+try:
+    from sqlalchemy.orm import declared_attr
+except ImportError:
+    # SQLAlchemy < 1.4
+    from sqlalchemy.ext.declarative import declared_attr
 
 from pyomo_orm.core.models import Base
+from pyomo_orm.core.utils import as_dataframe
 
 
 class ProblemRunMixin:
@@ -14,14 +22,30 @@ class ProblemRunMixin:
     def problem_run(cls):
         return relationship('ProblemRun')
 
+    def problem_runs_using(self):
+        """
+        Returns a query of the ProblemRuns that used this row
+        """
+        return ProblemRun.using(type(self), self.id)
+
 
 class ProblemRun(Base):
     __tablename__ = 'problem_runs'
 
     id = Column(Integer, primary_key=True)
-    problem_details_id = Column(Integer, ForeignKey('problem_details.id'))
+    problem_details_id = Column(Integer, ForeignKey('problem_details.id'), index=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    solver_status = Column(String, nullable=True)
+    termination_condition = Column(String, nullable=True)
+    objective_value = Column(Float, nullable=True)
+    wall_time = Column(Float, nullable=True)
+    data_load_time = Column(Float, nullable=True)
+    n_vars = Column(Integer, nullable=True)
+    n_constraints = Column(Integer, nullable=True)
+    n_nonzeros = Column(Integer, nullable=True)
 
     problem_details = relationship('ProblemDetail', back_populates='runs')
+    metrics = relationship('ProblemRunMetric', back_populates='problem_run')
 
     def __repr__(self):
         return '<ProblemRun: {problem_name} run_id={id}>'.format(
@@ -29,6 +53,153 @@ class ProblemRun(Base):
             id=self.id
         )
 
+    @classmethod
+    def using(cls, model, row_id):
+        """
+        Returns a query of the ProblemRuns that used the row of model with
+        id row_id
+        """
+        return cls.query().join(
+            ProblemRunMembership,
+            ProblemRunMembership.problem_run_id == cls.id
+        ).filter(
+            ProblemRunMembership.table_name == model.__table__.name,
+            ProblemRunMembership.first_id <= row_id,
+            ProblemRunMembership.last_id >= row_id
+        ).distinct()
+
+    def used_ranges(self, model):
+        """
+        Returns the ids of the rows of model used by this run as a sorted
+        list of (first_id, last_id) ranges
+        """
+        return ProblemRunMembership.query().with_entities(
+            ProblemRunMembership.first_id,
+            ProblemRunMembership.last_id
+        ).filter(
+            ProblemRunMembership.problem_run_id == self.id,
+            ProblemRunMembership.table_name == model.__table__.name
+        ).order_by(ProblemRunMembership.first_id).all()
+
+    def used_ids(self, model):
+        """
+        Returns the ids of the rows of model used by this run as a numpy
+        array
+        """
+        ranges = self.used_ranges(model)
+        if not ranges:
+            return np.array([], dtype=np.int64)
+        return np.concatenate([
+            np.arange(first, last + 1, dtype=np.int64) for first, last in ranges
+        ])
+
+    @classmethod
+    def history(cls, problem_name=None, metrics=True):
+        """
+        Returns a pandas DataFrame of runs, oldest first, with the name and
+        version of their problem and, if metrics is True, a column for each
+        ProblemRunMetric name. Only runs of problem_name if given.
+        """
+        runs = cls.query().join(cls.problem_details).with_entities(
+            *[c for c in cls.__table__.columns],
+            ProblemDetail.name.label('problem_name'),
+            ProblemDetail.version.label('problem_version')
+        ).order_by(cls.id)
+        if problem_name is not None:
+            runs = runs.filter(ProblemDetail.name == problem_name)
+        df = as_dataframe(runs)
+        if not metrics:
+            return df
+        values = ProblemRunMetric.query().with_entities(
+            ProblemRunMetric.problem_run_id,
+            ProblemRunMetric.name,
+            ProblemRunMetric.value
+        ).filter(ProblemRunMetric.problem_run_id.in_(runs.with_entities(cls.id)))
+        metric_df = as_dataframe(values)
+        if metric_df.empty:
+            return df
+        wide = metric_df.pivot(index='problem_run_id', columns='name', values='value')
+        return df.merge(wide, how='left', left_on='id', right_index=True)
+
+
+class ProblemRunMetric(Base):
+    """
+    A named measurement of a run, e.g. the seconds spent in a phase
+    """
+    __tablename__ = 'problem_run_metrics'
+
+    id = Column(Integer, primary_key=True)
+    problem_run_id = Column(Integer, ForeignKey('problem_runs.id'), index=True)
+    name = Column(String)
+    value = Column(Float)
+
+    problem_run = relationship('ProblemRun', back_populates='metrics')
+
+    def __repr__(self):
+        return '<ProblemRunMetric: {name}={value}>'.format(
+            name=self.name,
+            value=self.value
+        )
+
+class ProblemRunMembership(Base):
+    """
+    A range of consecutive ids of the rows of a table used by a problem run.
+    Runs usually use contiguous or mostly unchanged id sets, so a run's rows
+    are stored as few ranges.
+    """
+    __tablename__ = 'problem_run_memberships'
+    __table_args__ = (
+        Index('ix_problem_run_memberships_rows', 'table_name', 'first_id', 'last_id'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    problem_run_id = Column(Integer, ForeignKey('problem_runs.id'), index=True)
+    table_name = Column(String)
+    first_id = Column(Integer)
+    last_id = Column(Integer)
+
+    def __repr__(self):
+        return '<ProblemRunMembership: {table} {first}-{last}>'.format(
+            table=self.table_name,
+            first=self.first_id,
+            last=self.last_id
+        )
+
+    @staticmethod
+    def id_ranges(ids):
+        """
+        Returns the distinct ids as a list of (first_id, last_id) ranges of
+        consecutive ids
+        """
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        if len(ids) == 0:
+            return []
+        breaks = np.flatnonzero(np.diff(ids) != 1)
+        firsts = ids[np.concatenate(([0], breaks + 1))]
+        lasts = ids[np.concatenate((breaks, [len(ids) - 1]))]
+        return list(zip(firsts.tolist(), lasts.tolist()))
+
+    @classmethod
+    def rows(cls, problem_run_ids, model_ids):
+        """
+        Returns the table rows recording that each of problem_run_ids used
+        model_ids, a dict of model to ids, for a bulk insert
+        """
+        rows = []
+        for model, ids in model_ids.items():
+            ranges = cls.id_ranges(ids)
+            for problem_run_id in problem_run_ids:
+                rows.extend(
+                    {
+                        'problem_run_id': problem_run_id,
+                        'table_name': model.__table__.name,
+                        'first_id': first,
+                        'last_id': last
+                    } for first, last in ranges
+                )
+        return rows
+
+
 class ProblemDetail(Base):
     __tablename__ = 'problem_details'
 
@@ -1,3 +1,5 @@
 from .base_problem import BaseProblem
+from .async_problem import AsyncBaseProblem
+from .scenarios import ScenarioResult
 
-__all__ = ['BaseProblem']
+__all__ = ['BaseProblem', 'AsyncBaseProblem', 'ScenarioResult']
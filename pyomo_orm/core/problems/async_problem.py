@@ -0,0 +1,128 @@
+import asyncio
+import functools
+import time
+
+from pyomo_orm.core.database import async_session
+from pyomo_orm.core.snapshots import atable_fingerprint
+from .base_problem import BaseProblem
+
+
+class AsyncBaseProblem(BaseProblem):
+    """
+    A BaseProblem whose data loading and solve recording run on an async
+    engine (see pyomo_orm.core.database.bind_async_engine), so they don't
+    block the event loop. The snapshot cache is not used by adata.
+
+    Needs SQLAlchemy>=1.4 and an async driver, installed with the async
+    extra (pip install pyomo-orm[async], which includes aiosqlite).
+    """
+    _prefetched_fingerprints = None
+
+    async def adata(self):
+        """
+        Async version of data. The fetch groups and the coefficients of the
+        linear constraints are gathered concurrently, each with its own
+        AsyncSession.
+        """
+        plan = self._plan_missing_data(self._orm_data_components)
+        linear_constraints = [
+            c for c in self._orm_linear_constraints if c.data_key not in self._data_cache
+        ]
+        if plan or linear_constraints:
+            with self._phase('data'):
+                fetched = await asyncio.gather(*[
+                    model.aget_data_many(
+                        [c.data_spec for c in group.values()],
+                        queryset=queryset,
+                        row_counter=self._row_counter
+                    ) for (model, queryset), group in plan
+                ], *[c.afetch_coefficients() for c in linear_constraints])
+            self._store_fetched(plan, [
+                dict(zip(group.keys(), results))
+                for (_, group), results in zip(plan, fetched)
+            ])
+            for c, coefficients in zip(linear_constraints, fetched[len(plan):]):
+                self._data_cache[c.data_key] = (c.models, coefficients)
+        return {self.namespace: self._cached_data_of(self._orm_data_sources)}
+
+    async def acreate_instance(self, *args, **kwargs):
+        """
+        As create_instance, but loading the data with adata and, if
+        __refreshable__, taking the fingerprints of the tables with
+        atable_fingerprint before the data is loaded
+        """
+        if self.__refreshable__:
+            models = list(self._tracked_models)
+            fingerprints = await asyncio.gather(*[atable_fingerprint(m) for m in models])
+            self._prefetched_fingerprints = dict(zip(models, fingerprints))
+        if 'data' not in kwargs:
+            kwargs.update({'data': await self.adata()})
+        try:
+            return self.create_instance(*args, **kwargs)
+        finally:
+            self._prefetched_fingerprints = None
+
+    def _fingerprint_tables(self, models):
+        """
+        As BaseProblem._fingerprint_tables, using the fingerprints taken by
+        acreate_instance if there are any
+        """
+        fingerprints = self._prefetched_fingerprints
+        if fingerprints is not None and set(fingerprints) == set(models):
+            return fingerprints
+        return super()._fingerprint_tables(models)
+
+    async def asolve(self, executor=None, **kwargs):
+        """
+        Solves self.instance in executor (the event loop's default if None)
+        and records the solve asynchronously.
+
+        Returns: solve results as a dict
+        """
+        loop = asyncio.get_running_loop()
+        with self._phase('solve'):
+            results = await loop.run_in_executor(
+                executor,
+                functools.partial(self.solver.solve, self.instance, **kwargs)
+            )
+        with self._phase('record_solve'):
+            await self._arecord_solve(results)
+        if self.profiler is not None:
+            self.last_profile = self.profiler.finish()
+        return results
+
+    async def _arecord_solve(self, results):
+        """
+        Async version of _record_solve, running the steps of _record_steps
+        in an AsyncSession
+        """
+        metrics = self._solve_metrics(results, self.instance)
+        start = time.perf_counter()
+        model_ids = {
+            model: self._union_ids([
+                await b.aids() if hasattr(b, 'aids') else b for b in buffers
+            ])
+            for model, buffers in self._pyomo_orm_model_id_buffers.items()
+        }
+        timings = {'model_ids': time.perf_counter() - start}
+        async with async_session() as s:
+            try:
+                problem_runs = await self._arun_steps(
+                    self._record_steps(s, [metrics], model_ids, timings, start)
+                )
+            except Exception:
+                await s.rollback()
+                raise
+        self._recorded(problem_runs, model_ids, timings, start)
+
+    @staticmethod
+    async def _arun_steps(steps):
+        """
+        Runs the steps of _record_steps in an AsyncSession, awaiting each,
+        returning its value
+        """
+        try:
+            while True:
+                await next(steps)
+        except StopIteration as stop:
+            return stop.value
@@ -1,16 +1,107 @@
-from pyomo.environ import AbstractModel, SolverFactory
+import contextlib
+import functools
+import itertools
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-from pyomo_orm.core.models import ProblemRun, ProblemDetail
+import numpy as np
+
+import pyomo.kernel as pmo
+from pyomo.environ import (AbstractModel, ConcreteModel, Constraint, Objective,
+                           Param, SolverFactory, Var, value)
+
+from pyomo_orm.core.database import Session, add_change_listener, notify_changed
+from pyomo_orm.core.kernel import data_objects, is_kernel
+from pyomo_orm.core.mixins import LazyModelIds
+from pyomo_orm.core.models import (ProblemRun, ProblemRunMetric,
+                                   ProblemRunMembership, ProblemDetail)
+from pyomo_orm.core.profiling import Profiler, model_size
+from pyomo_orm.core.snapshots import fingerprint_columns, snapshot_key, table_fingerprint
+from .scenarios import init_scenario_worker, solve_overrides, solve_scenario
 from pyomo_orm.core.wrappers import (BaseORMWrapper, ORMSet, ORMParam, ORMVar,
-                                    ORMConstraint, ORMObjective)
+                                    ORMConstraint, ORMLinearConstraint, ORMObjective)
+
+ORM_COMPONENT_KINDS = (ORMSet, ORMParam, ORMVar, ORMConstraint, ORMObjective)
+BUILD_PHASES = ('create_instance', 'build_concrete', 'build_kernel')
+
 
 class BaseProblem:
     """
     A base class to make optimisation problems from. BaseProblem provides
     useful methods for recording details regarding solves
     (via the Problem* models) and which components were built using pyomo_orm
+
+    Setting snapshot_cache to a DataSnapshotCache stores the problem data on
+    disk, so unchanged data is loaded without querying the tables. Only the
+    data of models with an __updated_at_column__ is stored, as changes to
+    the rows of other tables can't be detected.
+
+    Setting __refreshable__ records the state of the tables when an instance
+    is built, so refresh can update it in place.
+
+    The rows used by each run are recorded as ProblemRunMemberships. Set
+    __tag_problem_run_id__ to also set problem_run_id on the rows of models
+    with the ProblemRunMixin, remembering only the latest run.
+
+    enable_profiling records the time and SQL statements of each phase in
+    last_profile; see pyomo_orm.core.profiling.
+
+    Setting __fetch_workers__ above 1 fetches the data with a pool of that
+    many threads, each with its own session. This needs an engine whose
+    connections are shared between threads, i.e. not an in-memory sqlite
+    database.
+
+    The ORM components of a problem class are collected once, when the class
+    is created, from its body and those of its bases; components added to
+    the class afterwards are not found.
+
+    The ORM components are shared by the problems of a class, and point at
+    one problem at a time: the one most recently created, or that last
+    started defining, fetching data or building an instance. Builds of
+    several problems of a class can be interleaved, e.g. in one event loop
+    with AsyncBaseProblem, but not run at the same time in several threads.
+
+    Setting __backend__ to 'kernel' makes create_instance build a
+    pyomo.kernel block with build_kernel, which takes less memory for
+    large instances. The solver must support pyomo.kernel models.
     """
     __solver__ = 'cbc'
+    __backend__ = 'environ'
+    __record_batch_size__ = 500
+    __tag_problem_run_id__ = False
+    __fetch_workers__ = 1
+    __refreshable__ = False
+    profiler = None
+    last_profile = None
+    snapshot_cache = None
+    _orm_components = {kind: {} for kind in ORM_COMPONENT_KINDS}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._register_orm_components()
+
+    @classmethod
+    def _register_orm_components(cls):
+        """
+        Collects the ORM components of cls, by kind, in the order they are
+        defined. A component of a base class can be overridden, or removed
+        by setting its name to something else, in a subclass.
+        """
+        components = {}
+        for klass in reversed(cls.__mro__):
+            for attr, value in vars(klass).items():
+                if isinstance(value, BaseORMWrapper):
+                    components[attr] = value
+                elif attr in components:
+                    del components[attr]
+        cls._orm_components = {
+            kind: {
+                attr: value for attr, value in components.items()
+                if isinstance(value, kind)
+            }
+            for kind in ORM_COMPONENT_KINDS
+        }
 
     def __init__(self, name, description='', version=''):
         self.pyomo_model = AbstractModel(name=name)
@@ -19,30 +110,164 @@ class BaseProblem:
         self.description = description
         self.version = version
         self.problem_detail = None
+        self.current_problem_run = None
+        self._model_ids = {}
+        self._component_cache = {}
+        self._data_cache = {}
+        self._snapshot_models = {}
+        self._built_rows = {}
+        self._build_data = None
+        self.instance = None
+        self._component_model = self.pyomo_model
+        self._instance_state = None
+        self.phase_timings = {}
+        self._phases_recorded = False
         self._set_component_problems()
+        add_change_listener(self)
 
     def _set_component_problems(self):
-        for attr in dir(type(self)):
-            if isinstance(getattr(type(self), attr), BaseORMWrapper):
-                setattr(getattr(self, attr), '_problem', self)
+        """
+        Points the ORM components, which are shared by the problems of a
+        class, at this problem
+        """
+        for components in self._orm_components.values():
+            for component in components.values():
+                component._problem = self
+
+    def cached_component(self, name, models, build):
+        """
+        Returns the pyomo component called name, built from models, calling
+        build to make it if it is not cached
+        """
+        return self._cached(self._component_cache, name, models, build)
+
+    def cached_data(self, name, models, fetch):
+        """
+        Returns the data for the component called name, fetched from models,
+        calling fetch to get it if it is not cached
+        """
+        return self._cached(self._data_cache, name, models, fetch)
+
+    @staticmethod
+    def _cached(cache, name, models, build):
+        if name not in cache:
+            cache[name] = (models, build())
+        return cache[name][1]
+
+    def invalidate(self, model=None):
+        """
+        Discards the cached components and data built from model, or
+        everything cached if model is None, and the snapshots this problem
+        stored of them. Called automatically when pyomo_orm writes to a
+        model's table. Components indexed by a discarded set are discarded
+        too, as they were built on it.
+        """
+        for cache in (self._component_cache, self._data_cache):
+            stale = set(n for n, (m, _) in cache.items() if model is None or model in m)
+            if cache is self._component_cache:
+                stale = self._dependent_components(stale)
+            for name in stale.intersection(cache):
+                del cache[name]
+        for key, models in list(self._snapshot_models.items()):
+            if model is None or model in models:
+                self.snapshot_cache.discard(key)
+                del self._snapshot_models[key]
+
+    def _dependent_components(self, names):
+        """
+        Returns names and the names of the components indexed, directly or
+        through other sets, by the components called names
+        """
+        names = set(names)
+        components = {
+            n: c for kind in self._orm_components.values() for n, c in kind.items()
+        }
+        while True:
+            dependents = set(
+                n for n, c in components.items()
+                if n not in names and names.intersection(c._index_orm_set_names)
+            )
+            if not dependents:
+                return names
+            names.update(dependents)
+
+    def enable_profiling(self, *sinks):
+        """
+        Starts profiling the problem's phases. Each Profile is passed to
+        sinks (callables taking a Profile, e.g. logging_sink or a
+        JSONFileSink) after a solve, and the current one is last_profile.
+        """
+        self.disable_profiling()
+        self.profiler = Profiler(self.name, sinks)
+        self.last_profile = self.profiler.profile
+
+    def disable_profiling(self):
+        if self.profiler is not None:
+            self.profiler.close()
+            self.profiler = None
+
+    def _span(self, name, **extra):
+        """
+        Returns a context manager timing a span of the current Profile, or
+        doing nothing if profiling is disabled
+        """
+        if self.profiler is None:
+            return contextlib.nullcontext({})
+        return self.profiler.span(name, **extra)
+
+    @contextlib.contextmanager
+    def _phase(self, name):
+        """
+        Times a phase of the problem into self.phase_timings, and as a span
+        if profiling. The timings are those of the current build and solve:
+        they are cleared by the first phase after a solve is recorded, and
+        building an instance discards the timing of an earlier build.
+        """
+        if self._phases_recorded:
+            self.phase_timings = {}
+            self._phases_recorded = False
+        if name in BUILD_PHASES:
+            for build in BUILD_PHASES:
+                self.phase_timings.pop(build, None)
+        start = time.perf_counter()
+        with self._span(name):
+            yield
+        self.phase_timings[name] = time.perf_counter() - start
+
+    @property
+    def _row_counter(self):
+        """
+        Returns the profiler's counter of rows fetched, or None if profiling
+        is disabled
+        """
+        if self.profiler is None:
+            return None
+        return self.profiler.count_rows_fetched
+
+    def _record_model_size(self, instance):
+        if self.profiler is not None:
+            self.profiler.profile.model_size = model_size(instance)
 
     def define_problem(self):
-        self.define_sets()
-        self.define_params()
-        self.define_vars()
-        self.define_constraints()
-        self.define_objective()
+        self._set_component_problems()
+        with self._phase('define_problem'):
+            self.define_sets()
+            self.define_params()
+            self.define_vars()
+            self.define_constraints()
+            self.define_objective()
 
     def define_sets(self):
         """
         Assigns all ORMSet.pyomo_set to self.pyomo_model
         """
         for name, orm_set in self.orm_sets.items():
-            setattr(
-                self.pyomo_model,
-                name,
-                orm_set.pyomo_set
-            )
+            with self._span(name):
+                setattr(
+                    self.pyomo_model,
+                    name,
+                    orm_set.pyomo_set
+                )
 
 
     def define_params(self):
@@ -50,44 +275,48 @@ class BaseProblem:
         Assigns all ORMParam.pyomo_param to self.pyomo_model
         """
         for name, orm_param in self.orm_params.items():
-            setattr(
-                self.pyomo_model,
-                name,
-                orm_param.pyomo_param
-            )
+            with self._span(name):
+                setattr(
+                    self.pyomo_model,
+                    name,
+                    orm_param.pyomo_param
+                )
 
     def define_vars(self):
         """
         Assigns all ORMVar.pyomo_var to self.pyomo_model
         """
         for name, orm_var in self.orm_vars.items():
-            setattr(
-                self.pyomo_model,
-                name,
-                orm_var.pyomo_var
-            )
+            with self._span(name):
+                setattr(
+                    self.pyomo_model,
+                    name,
+                    orm_var.pyomo_var
+                )
 
     def define_constraints(self):
         """
         Assigns all ORMConstraint.pyomo_constraint to self.pyomo_model
         """
         for name, orm_constraint in self.orm_constraints.items():
-            setattr(
-                self.pyomo_model,
-                name,
-                orm_constraint.pyomo_constraint
-            )
+            with self._span(name):
+                setattr(
+                    self.pyomo_model,
+                    name,
+                    orm_constraint.pyomo_constraint
+                )
 
     def define_objective(self):
         """
         Assigns all ORMObjective.pyomo_objective to self.pyomo_model
         """
         for name, orm_objective in self.orm_objectives.items():
-            setattr(
-                self.pyomo_model,
-                name,
-                orm_objective.pyomo_objective
-            )
+            with self._span(name):
+                setattr(
+                    self.pyomo_model,
+                    name,
+                    orm_objective.pyomo_objective
+                )
 
     def create_instance(self, *args, **kwargs):
         """
@@ -96,16 +325,365 @@ class BaseProblem:
         dictionary created with self.create_problem_data and the namespace
         stored with self.namespace.
 
+        If __backend__ is 'kernel' the instance is made with build_kernel
+        from data instead.
+
         Returns: instance of a ConcreteModel
         """
+        if self.__backend__ == 'kernel':
+            return self.build_kernel(data=kwargs.get('data'))
+        self._set_component_problems()
         if 'data' not in kwargs:
             kwargs.update({'data':self.data})
         if 'namespace' not in kwargs:
             kwargs.update({'namespace':self.namespace})
-        instance = self.pyomo_model.create_instance(*args, **kwargs)
+        # ids are captured afresh for each instance
+        for model_ids in self._model_ids.values():
+            model_ids.reset()
+        with self._phase('create_instance'), self._building(kwargs['data'][kwargs['namespace']]):
+            instance = self.pyomo_model.create_instance(*args, **kwargs)
+        self._record_model_size(instance)
+        self.instance = instance
+        self._component_model = self.pyomo_model
+        self._track_instance(
+            kwargs['data'][kwargs['namespace']],
+            functools.partial(self.create_instance, *args)
+        )
+        return self.instance
+
+    def build_concrete(self, mutable=False, data=None):
+        """
+        Builds a ConcreteModel directly from the ORM components, skipping
+        self.pyomo_model and AbstractModel.create_instance. Sets and params
+        are initialised from data (self.data unless given); params are
+        created with mutable unless the ORMParam sets it.
+
+        Returns: instance of a ConcreteModel
+        """
+        self._set_component_problems()
+        if data is None:
+            data = self.data
+        di = data[self.namespace]
+        with self._phase('build_concrete'), self._building(di):
+            instance = ConcreteModel(name=self.name)
+            for name, orm_set in self.orm_sets.items():
+                setattr(instance, name, orm_set.concrete_set(di.get(name, {}), instance))
+            for name, orm_param in self.orm_params.items():
+                setattr(
+                    instance,
+                    name,
+                    orm_param.concrete_param(instance, di.get(name, {}), mutable=mutable)
+                )
+            for name, orm_var in self.orm_vars.items():
+                setattr(instance, name, orm_var._create_pyomo_var(instance))
+            for name, orm_constraint in self.orm_constraints.items():
+                setattr(instance, name, orm_constraint.create_constraint(instance))
+            for name, orm_objective in self.orm_objectives.items():
+                setattr(instance, name, orm_objective.create_objective(instance))
+        self._record_model_size(instance)
+        for model_ids in self._model_ids.values():
+            model_ids.reset()
         self.instance = instance
+        self._component_model = instance
+        self._track_instance(
+            di,
+            functools.partial(self.build_concrete, mutable=mutable)
+        )
         return self.instance
 
+    def build_kernel(self, data=None):
+        """
+        Builds a pyomo.kernel block from the ORM components. Sets are held on
+        the block as lists of their members and params as dicts of their
+        values (see pyomo_orm.core.kernel), initialised from data (self.data
+        unless given). Vars, constraints and objectives are kernel
+        containers indexed like their environ counterparts, so the same
+        rules build them. Params are constants: refresh rebuilds the block
+        when their data changes.
+
+        Returns: a pyomo.kernel block
+        """
+        self._set_component_problems()
+        if data is None:
+            data = self.data
+        di = data[self.namespace]
+        for model_ids in self._model_ids.values():
+            model_ids.reset()
+        with self._phase('build_kernel'), self._building(di):
+            instance = pmo.block()
+            for name, orm_set in self.orm_sets.items():
+                setattr(instance, name, orm_set.members(di.get(name, {})))
+            for name, orm_param in self.orm_params.items():
+                setattr(instance, name, orm_param.kernel_param(di.get(name, {})))
+            for name, orm_var in self.orm_vars.items():
+                setattr(instance, name, orm_var.kernel_var(instance))
+            for name, orm_constraint in self.orm_constraints.items():
+                constraint = orm_constraint.kernel_constraint(instance)
+                if constraint is not None:
+                    setattr(instance, name, constraint)
+            for name, orm_objective in self.orm_objectives.items():
+                setattr(instance, name, orm_objective.kernel_objective(instance))
+        self._record_model_size(instance)
+        self.instance = instance
+        # a kernel block has no components carrying their models
+        self._component_model = None
+        self._track_instance(di, self.build_kernel)
+        return self.instance
+
+    @contextlib.contextmanager
+    def _building(self, di):
+        """
+        Makes di the problem data an instance is being built from, which
+        ORMLinearConstraints take their coefficients from
+        """
+        self._build_data = di
+        try:
+            yield
+        finally:
+            self._build_data = None
+
+    def _track_instance(self, di, rebuild):
+        """
+        If __refreshable__, records the data the instance was built with, the
+        fingerprints of its tables and how to rebuild it for refresh
+        """
+        if not self.__refreshable__:
+            self._instance_state = None
+            return
+        components = self._orm_data_components
+        self._instance_state = {
+            'data': {name: dict(di.get(name, {})) for name in components},
+            'coefficients': {
+                c._name: c.coefficients_in(di) for c in self._orm_linear_constraints
+            },
+            'fingerprints': self._fingerprint_tables(self._tracked_models),
+            'rebuild': rebuild
+        }
+
+    @property
+    def _tracked_models(self):
+        """
+        Returns the set of models whose tables refresh checks for changes
+        """
+        models = set(m for c in self._orm_data_components.values() for m in c.models)
+        models.update(m for c in self._orm_linear_constraints for m in c.models)
+        return models
+
+    def _fingerprint_tables(self, models):
+        """
+        Returns a dict of each of models to its table_fingerprint
+        """
+        return {m: table_fingerprint(m) for m in models}
+
+    def refresh(self):
+        """
+        Brings self.instance up to date with changes to its tables since it
+        was built, without rebuilding it where possible.
+
+        Tables of models with an __updated_at_column__ whose fingerprint is
+        unchanged are skipped. If no rows were added to or removed from
+        such a table, only rows updated since the build are fetched. Rows
+        updated in place don't change the fingerprint of a table without an
+        __updated_at_column__, so the components of those models, and of
+        changed tables, are fetched again and compared in full. Changed
+        entries of mutable Params are set in place; entries set to NULL
+        take the Param's default. The instance is rebuilt if a set's members
+        change, an immutable Param changes, an entry cannot be set on its
+        Param, or linear constraint coefficients change.
+
+        Returns: True if the instance was updated in place, False if it was
+        rebuilt
+        """
+        state = self._instance_state
+        if state is None:
+            raise RuntimeError(
+                'refresh requires an instance built with __refreshable__ = True'
+            )
+        fingerprints = {m: table_fingerprint(m) for m in state['fingerprints']}
+        changed = set(m for m, fp in fingerprints.items() if fp != state['fingerprints'][m])
+        # tables without an updated-at column may have been updated in place
+        unversioned = set(m for m in fingerprints if m.__updated_at_column__ is None)
+        if not changed and not unversioned:
+            return True
+        # linear constraints' coefficients are not updated in place
+        if any(
+            self._coefficients_changed(c, changed, unversioned)
+            for c in self._orm_linear_constraints
+        ):
+            for model in changed.union(unversioned):
+                self.invalidate(model)
+            state['rebuild']()
+            return False
+        components = self._orm_data_components
+        affected = {
+            n: c for n, c in components.items()
+            if changed.intersection(c.models) or unversioned.intersection(c.models)
+        }
+        deltas = {}
+        for model in set(c.model for c in affected.values()):
+            group = {n: c for n, c in affected.items() if c.model is model}
+            # the updated rows of model don't show changes to joined models
+            joined_changed = any(
+                changed.intersection(c.models[1:]) or unversioned.intersection(c.models[1:])
+                for c in group.values()
+            )
+            deltas.update(self._refresh_deltas(
+                model,
+                group,
+                None if joined_changed else state['fingerprints'][model],
+                fingerprints[model]
+            ))
+        modified = set(changed)
+        for name, (updates, removed) in deltas.items():
+            if updates or removed:
+                modified.update(components[name].models)
+        for model in modified:
+            self.invalidate(model)
+        if not self._apply_deltas(deltas):
+            state['rebuild']()
+            return False
+        state['fingerprints'].update(fingerprints)
+        for name, (updates, removed) in deltas.items():
+            data = state['data'][name]
+            data.update(updates)
+            for k in removed:
+                del data[k]
+            self._data_cache[name] = (components[name].models, dict(data))
+        return True
+
+    def _coefficients_changed(self, linear_constraint, changed, unversioned):
+        """
+        Whether the coefficients of linear_constraint may differ from those
+        it was built with: one of its tables changed, or one without an
+        updated-at column has different coefficients
+        """
+        models = linear_constraint.models
+        if changed.intersection(models):
+            return True
+        if not unversioned.intersection(models):
+            return False
+        old = self._instance_state['coefficients'][linear_constraint._name]
+        new = linear_constraint._fetch_coefficients()
+        return any(not np.array_equal(old[k], new[k]) for k in new)
+
+    def _refresh_deltas(self, model, group, old_fingerprint, new_fingerprint):
+        """
+        Returns a dict of component name to (updates, removed keys) for the
+        components in group, all built from model. Set members that changed
+        are returned as the keys of updates. If old_fingerprint is None the
+        components are compared in full. Param entries updated to NULL are
+        returned as removed.
+        """
+        old_data = self._instance_state['data']
+        updated_at = model.__updated_at_column__
+        in_place = False
+        if updated_at is not None and old_fingerprint is not None:
+            # row count and other maxima unchanged: rows were only updated
+            u = 1 + fingerprint_columns(model).index(updated_at)
+            in_place = (
+                old_fingerprint[:u] + old_fingerprint[u + 1:]
+                == new_fingerprint[:u] + new_fingerprint[u + 1:]
+            )
+        deltas = {}
+        for (_, queryset), members in self._plan_data_fetches(group).items():
+            if queryset is None:
+                queryset = model.query()
+            sets = {n: c for n, c in members.items() if isinstance(c, ORMSet)}
+            params = {n: c for n, c in members.items() if n not in sets}
+            # set members can't be diffed from the updated rows alone
+            for name, new in self._fetch_group((model, queryset), sets).items():
+                changed = self._set_members(new) ^ self._set_members(old_data[name])
+                deltas[name] = ({m: None for m in changed}, set())
+            if in_place and all(c.indexed_by is not None for c in params.values()):
+                updated = queryset.filter(getattr(model, updated_at) > old_fingerprint[u])
+                for name, (new, nulls) in self._fetch_updated(model, updated, params).items():
+                    old = old_data[name]
+                    updates = {k: v for k, v in new.items() if k not in old or old[k] != v}
+                    deltas[name] = (updates, nulls.intersection(old))
+                continue
+            for name, new in self._fetch_group((model, queryset), params).items():
+                old = old_data[name]
+                updates = {k: v for k, v in new.items() if k not in old or old[k] != v}
+                deltas[name] = (updates, set(old) - set(new))
+        return deltas
+
+    @staticmethod
+    def _fetch_updated(model, queryset, params):
+        """
+        Returns a dict of each param name in params to the entries in the
+        rows of queryset, which were updated in place, and the set of its
+        indices whose value is now NULL. Entries equal to the default are
+        included, as they may have had another value before.
+        """
+        attrs = []
+        for c in params.values():
+            attrs.extend(model._index_attrs(c.indexed_by))
+            attrs.append(c.from_attr)
+        attrs = list(dict.fromkeys(attrs))
+        position = {a: i for i, a in enumerate(attrs)}
+        rows = model._project(queryset, *attrs).all()
+        ret = {}
+        for name, c in params.items():
+            index = [position[a] for a in model._index_attrs(c.indexed_by)]
+            related = [
+                position[a] for a in model._related_attrs(model._index_attrs(c.indexed_by))
+            ]
+            v = position[c.from_attr]
+            new = {}
+            nulls = set()
+            for r in rows:
+                if any(r[i] is None for i in related):
+                    continue
+                k = r[index[0]] if len(index) == 1 else tuple(r[i] for i in index)
+                if r[v] is None:
+                    nulls.add(k)
+                else:
+                    new[k] = r[v]
+            ret[name] = (new, nulls)
+        return ret
+
+    @staticmethod
+    def _set_members(data):
+        values = data.get(None, [])
+        if not isinstance(values, list):
+            values = [values]
+        return set(values)
+
+    def _apply_deltas(self, deltas):
+        """
+        Applies the deltas from _refresh_deltas to self.instance.
+
+        Returns: False if the instance has to be rebuilt instead
+        """
+        # the params of a kernel block are constants
+        if is_kernel(self.instance):
+            return not any(updates or removed for updates, removed in deltas.values())
+        orm_sets = self.orm_sets
+        for name, (updates, removed) in deltas.items():
+            if name in orm_sets:
+                if updates:
+                    return False
+                continue
+            if not updates and not removed:
+                continue
+            param = getattr(self.instance, name)
+            if not param.mutable:
+                return False
+            if removed and param.default() is Param.NoValue:
+                return False
+            index_set = param.index_set()
+            if any(k not in index_set for k in updates if k is not None):
+                return False
+        for name, (updates, removed) in deltas.items():
+            if name in orm_sets:
+                continue
+            param = getattr(self.instance, name)
+            for k, v in updates.items():
+                param[k] = v
+            for k in removed:
+                param[k] = param.default()
+        return True
+
     def create_solver(self, *args, **kwargs):
         """
         Creates a solver using pyomo.environ.SolverFactory. Unless otherwise
@@ -126,18 +704,180 @@ class BaseProblem:
 
         Returns: solve results as a dict
         """
-        results = self.solver.solve(self.instance, **kwargs)
-        self._record_solve(results)
+        with self._phase('solve'):
+            results = self.solver.solve(self.instance, **kwargs)
+        with self._phase('record_solve'):
+            self._record_solve(results)
+        if self.profiler is not None:
+            self.last_profile = self.profiler.finish()
         return results
 
+    def solve_scenarios(self, scenarios, workers=None, solver=None, **kwargs):
+        """
+        Solves the problem once for each scenario in scenarios, a dict of
+        scenario name to overrides of the problem data. Overrides map
+        component names to a dict of the entries to replace, e.g.
+        ``{'high_cost': {'cost': {1: 10.0}}}``.
+
+        The data is fetched once and sent with the problem class to a pool
+        of worker processes (workers=None uses one per cpu). Each worker
+        builds its own problem with ``type(self)(name, description,
+        version)``, so the problem class must be importable and
+        constructible that way. workers=1 builds and solves the scenarios
+        with this problem, in this process, leaving self.instance as it was.
+        Solver defaults to __solver__ and kwargs are passed to solve. All
+        solves are recorded as ProblemRuns in one transaction at the end.
+        The problem is defined first if it has not been, so the rows used
+        can be recorded.
+
+        Returns: dict of scenario name to a ScenarioResult
+        """
+        if solver is None:
+            solver = self.__solver__
+        self._ensure_defined()
+        problem_args = (type(self), (self.name, self.description, self.version))
+        names = list(scenarios)
+        overrides = [scenarios[n] for n in names]
+        if workers == 1:
+            solved = self._solve_scenarios_here(overrides, solver, kwargs)
+        else:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=init_scenario_worker,
+                initargs=(problem_args, self.data, solver, kwargs)
+            ) as pool:
+                solved = list(pool.map(solve_scenario, overrides))
+        problem_runs = self._record_runs([r.metrics for r in solved])
+        return {
+            name: r._replace(problem_run=problem_run)
+            for name, r, problem_run in zip(names, solved, problem_runs)
+        }
+
+    def _solve_scenarios_here(self, overrides, solver, solve_kwargs):
+        """
+        Solves each of overrides with this problem, restoring its instance
+        afterwards
+
+        Returns: list of ScenarioResults
+        """
+        data = self.data
+        solver = SolverFactory(solver)
+        state = (self.instance, self._component_model, self._instance_state)
+        try:
+            return [solve_overrides(self, data, solver, solve_kwargs, o) for o in overrides]
+        finally:
+            self.instance, self._component_model, self._instance_state = state
+
+    def _ensure_defined(self):
+        """
+        Defines the problem if it has not been defined and no instance has
+        been built without it
+        """
+        if self._component_model is self.pyomo_model and not any(
+            True for _ in self.pyomo_model.component_objects()
+        ):
+            self.define_problem()
+
+    def write_solution(self, tag_run=False):
+        """
+        Writes the solved values of all ORMVars in self.instance back to
+        their models' from_attr columns. If tag_run is True the updated rows
+        are associated with self.current_problem_run.
+        """
+        problem_run = self.current_problem_run if tag_run else None
+        for orm_var in self.orm_vars.values():
+            orm_var.write_back(self.instance, problem_run=problem_run)
+
     def _record_solve(self, results):
         """
         Records a solve by
             * creating a ProblemDetail object for the problem if one
             does not already exist
             * creating a ProblemRun object for this solve
-            * associating the ProblemRun with all used models via their
-            problem_run foreign key
+            * recording the rows of all used models as ranges of ids in
+            ProblemRunMembership, with a single bulk insert
+            * if __tag_problem_run_id__, associating the ProblemRun with all
+            used rows via their problem_run foreign key, with one UPDATE per
+            model table (in batches of __record_batch_size__ ids)
+
+        All in a single transaction. Time taken by each step, in seconds, is
+        stored in self.record_timings.
+
+        The ProblemRun holds the solver status, objective value and model
+        size of the solve, and a ProblemRunMetric for each phase timing.
+        """
+        self._record_runs([self._solve_metrics(results, self.instance)])
+
+    def _solve_metrics(self, results, instance):
+        """
+        Returns a dict of the ProblemRun column values for a solve and the
+        phase timings to record as ProblemRunMetrics
+        """
+        columns = {
+            'wall_time': self.phase_timings.get('solve'),
+            'data_load_time': self.phase_timings.get('data'),
+            'n_vars': sum(1 for _ in data_objects(instance, Var)),
+            'n_constraints': sum(1 for _ in data_objects(instance, Constraint)),
+        }
+        if self.profiler is not None and self.profiler.profile.model_size:
+            columns['n_nonzeros'] = self.profiler.profile.model_size['nonzeros']
+        if results is not None:
+            columns['solver_status'] = str(results.solver.status)
+            columns['termination_condition'] = str(results.solver.termination_condition)
+        for objective in data_objects(instance, Objective):
+            columns['objective_value'] = value(objective, exception=False)
+            break
+        # record_solve is timed after its run has been recorded
+        phases = {k: v for k, v in self.phase_timings.items() if k != 'record_solve'}
+        return {'columns': columns, 'phases': phases}
+
+    def _new_problem_runs(self, metrics_list):
+        """
+        Returns a new ProblemRun, with its ProblemRunMetrics, for each dict
+        of metrics from _solve_metrics
+        """
+        return [
+            ProblemRun(
+                problem_details=self.problem_detail,
+                metrics=[
+                    ProblemRunMetric(name='{}_seconds'.format(k), value=v)
+                    for k, v in metrics['phases'].items()
+                ],
+                **metrics['columns']
+            ) for metrics in metrics_list
+        ]
+
+    def _record_runs(self, metrics_list):
+        """
+        Records a ProblemRun for each of metrics_list, from _solve_metrics, in
+        one transaction, as described in _record_solve. The used rows are
+        recorded for every run; if __tag_problem_run_id__ they are
+        associated with the last of the runs.
+
+        Returns: list of ProblemRun objects
+        """
+        start = time.perf_counter()
+        model_ids = self._pyomo_orm_model_ids
+        timings = {'model_ids': time.perf_counter() - start}
+        s = Session()
+        try:
+            problem_runs = self._run_steps(
+                self._record_steps(s, metrics_list, model_ids, timings, start)
+            )
+        except Exception:
+            s.rollback()
+            raise
+        self._recorded(problem_runs, model_ids, timings, start)
+        return problem_runs
+
+    def _record_steps(self, s, metrics_list, model_ids, timings, start):
+        """
+        A generator of the steps of _record_runs in the session s, shared by
+        sessions and AsyncSessions: it yields the result of each call to
+        the session that does I/O, which an async caller awaits before
+        resuming it. Step times go into timings.
+
+        Returns: list of ProblemRun objects, as the value of StopIteration
         """
         if self.problem_detail is None:
             self.problem_detail = ProblemDetail(
@@ -145,48 +885,180 @@ class BaseProblem:
                 description=self.description,
                 version=self.version
             )
-            self.problem_detail.save()
-        this_problem_run = ProblemRun(problem_details=self.problem_detail)
-        this_problem_run.save()
-        self.current_problem_run = this_problem_run
+            s.add(self.problem_detail)
+        problem_runs = self._new_problem_runs(metrics_list)
+        s.add_all(problem_runs)
+        yield s.flush()
+        timings['problem_run'] = time.perf_counter() - start
+
+        for step, statement, params in self._record_statements(
+            model_ids,
+            [r.id for r in problem_runs]
+        ):
+            step_start = time.perf_counter()
+            yield s.execute(statement, params)
+            timings[step] = timings.get(step, 0) + time.perf_counter() - step_start
+
+        commit_start = time.perf_counter()
+        yield s.commit()
+        timings['commit'] = time.perf_counter() - commit_start
+        return problem_runs
 
-        # add this_problem_run to all pertinent models
-        model_objects_used_in_problem = self._pyomo_orm_instance_components
-        for obj in model_objects_used_in_problem:
-            obj.problem_run = this_problem_run
-            obj.save()
+    @staticmethod
+    def _run_steps(steps):
+        """
+        Runs the steps of a blocking _record_steps, returning its value
+        """
+        try:
+            while True:
+                next(steps)
+        except StopIteration as stop:
+            return stop.value
 
+    def _recorded(self, problem_runs, model_ids, timings, start):
+        """
+        Updates the problem once problem_runs have been recorded
+        """
+        timings['total'] = time.perf_counter() - start
+        if self.__tag_problem_run_id__:
+            notify_changed(*model_ids.keys())
+        self.current_problem_run = problem_runs[-1]
+        self.record_timings = timings
+        self._phases_recorded = True
+        logging.debug(
+            'Recorded {0} problem run(s) up to {1} in {2}'.format(
+                len(problem_runs),
+                self.current_problem_run.id,
+                str(timings)
+            )
+        )
+
+    def _record_statements(self, model_ids, problem_run_ids):
+        """
+        Yields (step name, statement, params) to execute to record that the
+        runs problem_run_ids used model_ids, a dict of model to ids
+        """
+        rows = ProblemRunMembership.rows(problem_run_ids, model_ids)
+        if rows:
+            yield 'membership', ProblemRunMembership.__table__.insert(), rows
+        if self.__tag_problem_run_id__:
+            for model, ids in model_ids.items():
+                for statement in self._problem_run_updates(model, ids, problem_run_ids[-1]):
+                    yield model.__name__, statement, None
+
+    def _problem_run_updates(self, model, ids, problem_run_id):
+        """
+        Yields the UPDATE statements setting problem_run_id on the rows of
+        model's table with the given ids, __record_batch_size__ ids at a time
+        """
+        table = model.__table__
+        if 'problem_run_id' not in table.c:
+            return
+        for start in range(0, len(ids), self.__record_batch_size__):
+            yield table.update().where(
+                table.c.id.in_(ids[start:start + self.__record_batch_size__])
+            ).values(problem_run_id=problem_run_id)
+
+    def model_ids_for(self, model, queryset=None):
+        """
+        Returns the LazyModelIds shared by all components of this problem
+        built from model and queryset
+        """
+        key = (model, queryset)
+        if key not in self._model_ids:
+            self._model_ids[key] = LazyModelIds(model, queryset)
+        return self._model_ids[key]
 
     @property
-    def _pyomo_orm_abstractmodel_components(self):
+    def _pyomo_orm_model_ids(self):
         """
-        Returns a list of component_objects in the pyomo_model that were created
-        by pyomo_orm (i.e. have the attr '_model')
+        Returns a dict of each Model used to create component_objects in the
+        pyomo_model to the ids of its objects that were used
         """
-        return [c for c in self.pyomo_model.component_objects() if hasattr(c, '_model')]
+        return {
+            model: self._union_ids([getattr(b, 'ids', b) for b in buffers])
+            for model, buffers in self._pyomo_orm_model_id_buffers.items()
+        }
 
     @property
-    def _pyomo_orm_instance_components(self):
-        """
-        Returns a python set of Model objects that have been used to create
-        component_objects and give them data in the pyomo_model
-        """
-        pyomo_orm_components = self._pyomo_orm_abstractmodel_components
-        object_list = []
-        for c in pyomo_orm_components:
-            object_list.extend(
-                c._model.query().filter(
-                    c._model.id.in_(c._model_ids)
-                ).all()
-            )
-        return set(object_list)
+    def _pyomo_orm_model_id_buffers(self):
+        """
+        Returns a dict of each Model used to create component_objects in the
+        pyomo_model to the distinct _model_ids of those components
+        """
+        buffers = {}
+        for model, model_ids in self._pyomo_orm_model_id_sources:
+            buffers.setdefault(model, {})[id(model_ids)] = model_ids
+        return {model: list(b.values()) for model, b in buffers.items()}
+
+    @property
+    def _pyomo_orm_model_id_sources(self):
+        """
+        Returns a list of (Model, LazyModelIds) of the components created by
+        pyomo_orm that the instance was built with. For a kernel block,
+        which has no such components, those of the ORMSets, ORMParams and
+        ORMVars are used.
+        """
+        if self._component_model is None:
+            return [
+                (c.model, c.model_ids) for c in itertools.chain(
+                    self.orm_sets.values(),
+                    self.orm_params.values(),
+                    self.orm_vars.values()
+                )
+            ]
+        return [(c._model, c._model_ids) for c in self._pyomo_orm_abstractmodel_components]
+
+    @staticmethod
+    def _union_ids(id_lists):
+        if len(id_lists) == 1:
+            return id_lists[0]
+        return sorted(set().union(*id_lists))
+
+    @property
+    def _pyomo_orm_abstractmodel_components(self):
+        """
+        Returns a list of component_objects in the model the instance was
+        built from (the pyomo_model, or the instance itself if it was made
+        with build_concrete) that were created by pyomo_orm (i.e. have the
+        attr '_model')
+        """
+        return [c for c in self._component_model.component_objects() if hasattr(c, '_model')]
 
     def _get_orm_components(self, orm_component_type):
-        ret = {}
-        for attr in dir(type(self)):
-            if isinstance(getattr(type(self), attr), orm_component_type):
-                ret[attr] = getattr(self, attr)
-        return ret
+        """
+        Returns a new dict of the ORM components of orm_component_type, which
+        callers are free to modify
+        """
+        return dict(self._orm_components[orm_component_type])
+
+    @property
+    def _orm_linear_constraints(self):
+        return [
+            c for c in self._orm_components[ORMConstraint].values()
+            if isinstance(c, ORMLinearConstraint)
+        ]
+
+    @property
+    def _orm_data_sources(self):
+        """
+        Returns a dict of each key of the problem data to the component its
+        data is fetched for: the ORMSets and ORMParams by name and the
+        ORMLinearConstraints by their data_key
+        """
+        sources = self._orm_data_components
+        sources.update((c.data_key, c) for c in self._orm_linear_constraints)
+        return sources
+
+    @property
+    def _orm_data_components(self):
+        """
+        Returns a dict of the ORMSets and ORMParams, the components that
+        fetch data
+        """
+        components = dict(self._orm_components[ORMSet])
+        components.update(self._orm_components[ORMParam])
+        return components
 
     @property
     def orm_sets(self):
@@ -208,11 +1080,130 @@ class BaseProblem:
     def orm_objectives(self):
         return self._get_orm_components(ORMObjective)
 
+    def _plan_data_fetches(self, components):
+        """
+        Groups components by the (model, queryset) they fetch from so each
+        group can be loaded with a single query.
+
+        Returns: dict of (model, queryset) to a dict of name: component
+        """
+        plan = {}
+        for name, orm_component in components.items():
+            key = (orm_component.model, orm_component.queryset)
+            plan.setdefault(key, {})[name] = orm_component
+        return plan
+
+    def _fetch_groups(self, plan):
+        """
+        Fetches each group of a data fetch plan, in parallel if
+        __fetch_workers__ > 1. Returns the results in plan order; an error
+        raised by a group is re-raised as it would be when fetching serially.
+        """
+        if self.__fetch_workers__ > 1 and len(plan) > 1:
+            with ThreadPoolExecutor(max_workers=self.__fetch_workers__) as pool:
+                futures = [
+                    pool.submit(self._fetch_group_in_thread, key, group)
+                    for key, group in plan
+                ]
+                return [f.result() for f in futures]
+        return [self._fetch_group(key, group) for key, group in plan]
+
+    def _fetch_group(self, key, group):
+        """
+        Returns a dict of each component name in group to its data
+        """
+        model, queryset = key
+        if not group:
+            return {}
+        with self._span(model.__name__, components=list(group)) as span:
+            results = model.get_data_many(
+                [c.data_spec for c in group.values()],
+                queryset=queryset,
+                row_counter=self._row_counter
+            )
+            span['entries'] = sum(len(r) for r in results)
+        return dict(zip(group.keys(), results))
+
+    def _fetch_group_in_thread(self, key, group):
+        """
+        Fetches a group with the worker thread's own session, releasing it
+        afterwards
+        """
+        model, queryset = key
+        try:
+            if queryset is not None:
+                queryset = queryset.with_session(Session())
+            return self._fetch_group((model, queryset), group)
+        finally:
+            Session.remove()
+
     @property
     def data(self):
-        di = {}
-        components = self.orm_sets
-        components.update(self.orm_params)
-        for name, orm_component in components.items():
-            di.update({name: orm_component.problem_data})
-        return {self.namespace: di}
+        """
+        Returns the problem data: the data of each ORMSet and ORMParam and
+        the coefficients of each ORMLinearConstraint (see
+        ORMLinearConstraint.data_key), in the problem's namespace
+        """
+        self._set_component_problems()
+        # only fetches are timed, not reads of the cached data
+        sources = self._orm_data_sources
+        if all(n in self._data_cache for n in sources):
+            return {self.namespace: self._cached_data_of(sources)}
+        with self._phase('data'):
+            return self._data()
+
+    def _data(self):
+        components = self._orm_data_sources
+        snapshotted = self._snapshotted_components(components)
+        if snapshotted:
+            key = snapshot_key(self.namespace, snapshotted)
+            snapshot = self.snapshot_cache.get(key)
+            if snapshot is not None:
+                for name, value in snapshot[self.namespace].items():
+                    self._data_cache[name] = (snapshotted[name].models, value)
+        plan = self._plan_missing_data(self._orm_data_components)
+        self._store_fetched(plan, self._fetch_groups(plan))
+        for c in self._orm_linear_constraints:
+            c.coefficients
+        if snapshotted:
+            if snapshot is None:
+                self.snapshot_cache.put(
+                    key, {self.namespace: self._cached_data_of(snapshotted)}
+                )
+            self._snapshot_models[key] = set(
+                m for c in snapshotted.values() for m in c.models
+            )
+        return {self.namespace: self._cached_data_of(components)}
+
+    def _snapshotted_components(self, components):
+        """
+        Returns the components whose data is stored in the snapshot_cache:
+        those built only from models with an __updated_at_column__, as the
+        fingerprints of other tables don't change when rows are updated in
+        place
+        """
+        if self.snapshot_cache is None:
+            return {}
+        return {
+            n: c for n, c in components.items()
+            if all(m.__updated_at_column__ is not None for m in c.models)
+        }
+
+    def _plan_missing_data(self, components):
+        """
+        Returns the fetch plan, as a list of items, for the components whose
+        data is not cached
+        """
+        missing = {n: c for n, c in components.items() if n not in self._data_cache}
+        return list(self._plan_data_fetches(missing).items())
+
+    def _store_fetched(self, plan, fetched):
+        """
+        Caches the results fetched for each group in plan
+        """
+        for (_, group), results in zip(plan, fetched):
+            for name, result in results.items():
+                self._data_cache[name] = (group[name].models, result)
+
+    def _cached_data_of(self, components):
+        return {name: self._data_cache[name][1] for name in components}
@@ -0,0 +1,82 @@
+"""
+Worker side of BaseProblem.solve_scenarios. Each worker process builds the
+problem once, from the problem class and base data it is initialised with,
+and then solves one instance per scenario it is sent.
+"""
+from collections import namedtuple
+
+from pyomo_orm.core.database import dispose_inherited_engine
+from pyomo_orm.core.kernel import extract_values
+
+ScenarioResult = namedtuple(
+    'ScenarioResult',
+    ['results', 'solution', 'metrics', 'problem_run']
+)
+
+_worker = {}
+
+
+def init_scenario_worker(problem_args, data, solver, solve_kwargs):
+    """
+    Builds the worker's problem. Workers solve from data and never query the
+    database; a forked worker still drops the engine it inherits, whose
+    pooled connections belong to the parent.
+    """
+    dispose_inherited_engine()
+    problem_class, args = problem_args
+    problem = problem_class(*args)
+    problem.define_problem()
+    _worker.update({
+        'problem': problem,
+        'data': data,
+        'solver': problem.create_solver(solver),
+        'solve_kwargs': solve_kwargs
+    })
+
+
+def scenario_data(data, namespace, overrides):
+    """
+    Returns a copy of data with the entries of each overridden component
+    replaced. Only the overridden components are copied.
+    """
+    di = dict(data[namespace])
+    for name, values in overrides.items():
+        di[name] = dict(di.get(name, {}))
+        di[name].update(values)
+    return {namespace: di}
+
+
+def solve_scenario(overrides):
+    """
+    Solves the worker's problem with overrides applied to its data
+
+    Returns: ScenarioResult without a problem_run, which is recorded by the
+    calling process
+    """
+    return solve_overrides(
+        _worker['problem'],
+        _worker['data'],
+        _worker['solver'],
+        _worker['solve_kwargs'],
+        overrides
+    )
+
+
+def solve_overrides(problem, data, solver, solve_kwargs, overrides):
+    """
+    Builds an instance of problem from data with overrides applied and
+    solves it with solver
+
+    Returns: ScenarioResult without a problem_run
+    """
+    instance = problem.create_instance(
+        data=scenario_data(data, problem.namespace, overrides)
+    )
+    with problem._phase('solve'):
+        results = solver.solve(instance, **solve_kwargs)
+    solution = {
+        name: extract_values(getattr(instance, name))
+        for name in problem.orm_vars
+    }
+    metrics = problem._solve_metrics(results, instance)
+    return ScenarioResult(results, solution, metrics, None)
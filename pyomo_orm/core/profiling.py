@@ -0,0 +1,189 @@
+"""
+Phase level profiling of problems. See BaseProblem.enable_profiling.
+"""
+import contextlib
+import functools
+import json
+import logging
+import threading
+import time
+import weakref
+
+from pyomo.core.expr.visitor import identify_variables
+from pyomo.environ import Constraint, Var
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from pyomo_orm.core.database import Session
+from pyomo_orm.core.kernel import data_objects
+
+
+class Profile:
+    """
+    Timings and counts collected for a problem between two solves.
+
+    spans is a list of dicts with the span's name (nested spans are joined
+    with '/'), seconds, SQL statements executed, rows fetched by the
+    problem's data queries and rows affected by DML, plus any extra details
+    such as the components fetched. model_size holds
+    the number of vars, constraints and nonzeros of the last instance.
+    """
+    def __init__(self, problem_name):
+        self.problem_name = problem_name
+        self.spans = []
+        self.model_size = {}
+
+    def seconds(self, name):
+        """
+        Returns the total seconds spent in spans called name
+        """
+        return sum(s['seconds'] for s in self.spans if s['name'] == name)
+
+    def to_dict(self):
+        return {
+            'problem': self.problem_name,
+            'spans': self.spans,
+            'model_size': self.model_size
+        }
+
+    def __repr__(self):
+        return '<Profile: {0} {1} spans>'.format(self.problem_name, len(self.spans))
+
+
+class Profiler:
+    """
+    Collects a Profile from spans and SQLAlchemy engine events, passing each
+    finished Profile to sinks: callables taking a Profile. Statements are
+    counted on engine, by default the one bound to Session (all engines if
+    none is bound), until the Profiler is closed or garbage collected.
+    """
+    def __init__(self, problem_name, sinks=(), engine=None):
+        self.problem_name = problem_name
+        self.sinks = list(sinks)
+        self.profile = Profile(problem_name)
+        self.statements = 0
+        self.rows = 0
+        self.rows_fetched = 0
+        self._local = threading.local()
+        if engine is None:
+            engine = Session.session_factory.kw.get('bind') or Engine
+        # the listeners hold the Profiler weakly, so it can be collected
+        ref = weakref.ref(self)
+        listeners = [
+            ('before_cursor_execute', functools.partial(_count_statement, ref)),
+            ('after_cursor_execute', functools.partial(_count_rows_affected, ref))
+        ]
+        for name, listener in listeners:
+            event.listen(engine, name, listener)
+        self._remove_listeners = weakref.finalize(self, _remove_listeners, engine, listeners)
+
+    def count_rows_fetched(self, n):
+        """
+        Adds n rows fetched by a query to the current spans
+        """
+        self.rows_fetched += n
+
+    @contextlib.contextmanager
+    def span(self, name, **extra):
+        """
+        Times the enclosed block as a span of the current Profile. Yields
+        the span's dict, which the block can add details to.
+        """
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(name)
+        record = dict(name='/'.join(stack), **extra)
+        statements, rows, rows_fetched = self.statements, self.rows, self.rows_fetched
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            record['statements'] = self.statements - statements
+            record['rows_fetched'] = self.rows_fetched - rows_fetched
+            record['rows_affected'] = self.rows - rows
+            stack.pop()
+            self.profile.spans.append(record)
+
+    def finish(self):
+        """
+        Passes the current Profile to the sinks and starts a new one
+
+        Returns: the finished Profile
+        """
+        profile = self.profile
+        self.profile = Profile(self.problem_name)
+        for sink in self.sinks:
+            sink(profile)
+        return profile
+
+    def close(self):
+        self._remove_listeners()
+
+
+def _count_statement(ref, *args):
+    profiler = ref()
+    if profiler is not None:
+        profiler.statements += 1
+
+
+def _count_rows_affected(ref, conn, cursor, *args):
+    profiler = ref()
+    if profiler is not None and cursor.rowcount is not None and cursor.rowcount > 0:
+        profiler.rows += cursor.rowcount
+
+
+def _remove_listeners(engine, listeners):
+    for name, listener in listeners:
+        event.remove(engine, name, listener)
+
+
+def model_size(instance):
+    """
+    Returns the number of vars, active constraints and nonzeros (variables
+    appearing in each constraint) of a pyomo model instance or kernel block
+    """
+    n_constraints = 0
+    nonzeros = 0
+    for c in data_objects(instance, Constraint):
+        n_constraints += 1
+        nonzeros += sum(1 for _ in identify_variables(c.body, include_fixed=False))
+    return {
+        'vars': sum(1 for _ in data_objects(instance, Var)),
+        'constraints': n_constraints,
+        'nonzeros': nonzeros
+    }
+
+
+def logging_sink(profile, level=logging.INFO):
+    """
+    Logs each span of profile
+    """
+    for span in profile.spans:
+        logging.log(
+            level,
+            '{0} {1}: {2:.3f}s, {3} statements'.format(
+                profile.problem_name,
+                span['name'],
+                span['seconds'],
+                span['statements']
+            )
+        )
+    if profile.model_size:
+        logging.log(level, '{0} model size: {1}'.format(
+            profile.problem_name,
+            str(profile.model_size)
+        ))
+
+
+class JSONFileSink:
+    """
+    Appends each profile as a line of JSON to the file at path
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, profile):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(profile.to_dict(), default=str) + '\n')
@@ -0,0 +1,145 @@
+"""
+Precomputed lookups over the declarative models and the pyomo sets made
+from them, used for set inference and join planning.
+
+A SchemaGraph is built once per declarative class registry, and rebuilt
+only when models are added to it. A SetIndex is built once per pyomo model,
+and rebuilt only when components are added to or deleted from it.
+"""
+import weakref
+from collections import deque, namedtuple
+
+from pyomo.environ import Set
+
+ForeignKeyEdge = namedtuple('ForeignKeyEdge', ['model', 'column', 'target', 'target_column'])
+ForeignKeyEdge.__doc__ = """
+A foreign key from column of model to target_column of target. Columns
+are given by their attribute names.
+"""
+
+_schema_graphs = {}
+_set_indexes = weakref.WeakKeyDictionary()
+
+
+class SchemaGraph:
+    """
+    The tables of the models in a declarative class registry and the foreign
+    keys between them:
+        * models: dict of tablename to model class
+        * foreign_keys: dict of (model, column) to the ForeignKeyEdges
+        from that column
+        * edges: dict of model to the ForeignKeyEdges from and to it
+    """
+    def __init__(self, registry):
+        self.models = {}
+        for c in registry.values():
+            if hasattr(c, '__tablename__') and hasattr(c, '__table__'):
+                self.models.setdefault(c.__tablename__, c)
+
+        self.foreign_keys = {}
+        self.edges = {model: [] for model in self.models.values()}
+        for model in self.models.values():
+            for column_key, column in model.__table__.c.items():
+                for fk in column.foreign_keys:
+                    tablename, target_column = fk.target_fullname.split('.')[-2:]
+                    target = self.models.get(tablename)
+                    if target is None:
+                        continue
+                    edge = ForeignKeyEdge(
+                        model,
+                        column_key,
+                        target,
+                        target.__table__.c[target_column].key
+                    )
+                    self.foreign_keys.setdefault((model, column_key), []).append(edge)
+                    self.edges[model].append(edge)
+                    if target is not model:
+                        self.edges[target].append(edge)
+
+    def model_for(self, tablename):
+        """
+        Returns the model mapped to tablename, or None
+        """
+        return self.models.get(tablename)
+
+    def targets(self, model, column):
+        """
+        Returns a list of the (target model, target column) that column of
+        model references
+        """
+        return [(e.target, e.target_column) for e in self.foreign_keys.get((model, column), ())]
+
+    def join_path(self, model, target, exclude=()):
+        """
+        Returns the shortest list of ForeignKeyEdges joining model to target,
+        following foreign keys in either direction, or None if they are not
+        connected. Paths through the models in exclude (e.g. ProblemRun,
+        which every model with the ProblemRunMixin references) are skipped.
+        """
+        previous = {m: None for m in exclude}
+        previous[model] = None
+        queue = deque([model])
+        while queue:
+            current = queue.popleft()
+            if current is target:
+                path = []
+                while previous[current] is not None:
+                    edge, current = previous[current]
+                    path.append(edge)
+                return path[::-1]
+            for edge in self.edges.get(current, ()):
+                other = edge.target if edge.model is current else edge.model
+                if other not in previous:
+                    previous[other] = (edge, current)
+                    queue.append(other)
+        return None
+
+
+class SetIndex:
+    """
+    The sets of a pyomo model that were created by pyomo-orm, by the
+    (model, from_attr) they were created from, in declaration order
+    """
+    def __init__(self, pyomo_model):
+        self.sets = {}
+        self._positions = {}
+        for position, s in enumerate(pyomo_model.component_objects(Set)):
+            if hasattr(s, '_model'):
+                self.sets.setdefault((s._model, s._from_attr), []).append(s)
+                self._positions[id(s)] = position
+
+    def lookup(self, *keys):
+        """
+        Returns the sets created from any of keys, (model, from_attr) pairs,
+        in declaration order
+        """
+        found = {}
+        for key in keys:
+            for s in self.sets.get(key, ()):
+                found[id(s)] = s
+        return sorted(found.values(), key=lambda s: self._positions[id(s)])
+
+
+def schema_graph(registry):
+    """
+    Returns the SchemaGraph of the declarative class registry, building it
+    if the registry is new or has changed
+    """
+    cached = _schema_graphs.get(id(registry))
+    if cached is None or cached[0] is not registry or cached[1] != len(registry):
+        cached = (registry, len(registry), SchemaGraph(registry))
+        _schema_graphs[id(registry)] = cached
+    return cached[2]
+
+
+def set_index(pyomo_model):
+    """
+    Returns the SetIndex of pyomo_model, building it if the model is new or
+    its components have changed
+    """
+    version = (len(pyomo_model._decl_order), len(pyomo_model._decl))
+    cached = _set_indexes.get(pyomo_model)
+    if cached is None or cached[0] != version:
+        cached = (version, SetIndex(pyomo_model))
+        _set_indexes[pyomo_model] = cached
+    return cached[1]
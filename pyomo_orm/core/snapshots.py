@@ -0,0 +1,140 @@
+import hashlib
+import os
+import pickle
+
+from sqlalchemy import func
+
+from pyomo_orm.core.database import Session, async_session, select_columns
+
+
+class DataSnapshotCache:
+    """
+    An on-disk cache of problem data, stored as one pickle per snapshot in
+    directory. When the files exceed max_bytes in total the least recently
+    used are removed.
+
+    Snapshots are keyed with snapshot_key, which combines each component's
+    query with a fingerprint of its model's table (see table_fingerprint).
+    BaseProblem only snapshots the data of models with an
+    __updated_at_column__, whose fingerprint changes when a row is updated.
+    """
+    def __init__(self, directory, max_bytes=2 ** 30):
+        self.directory = os.path.expanduser(directory)
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, '{}.pkl'.format(key))
+
+    def get(self, key):
+        """
+        Returns the snapshot stored under key, or None if there isn't one
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        os.utime(path)
+        return data
+
+    def put(self, key, data):
+        path = self._path(key)
+        tmp_path = '{}.tmp'.format(path)
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used snapshots until the cache fits in
+        max_bytes
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.pkl'):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+    def discard(self, key):
+        """
+        Removes the snapshot stored under key, if there is one
+        """
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.pkl'):
+                os.remove(os.path.join(self.directory, name))
+
+
+def fingerprint_columns(model):
+    """
+    Returns the names of the columns whose maximum is part of model's
+    fingerprint: __fingerprint_columns__ and __updated_at_column__
+    """
+    columns = list(model.__fingerprint_columns__)
+    if model.__updated_at_column__ is not None and model.__updated_at_column__ not in columns:
+        columns.append(model.__updated_at_column__)
+    return columns
+
+
+def table_fingerprint(model):
+    """
+    Returns a cheap fingerprint of model's table: its row count and the
+    maximum of each of its fingerprint_columns. Setting an updated-at column
+    as the model's __updated_at_column__ detects rows changed in place.
+    """
+    columns = [getattr(model, c) for c in fingerprint_columns(model)]
+    s = Session()
+    row = s.query(func.count(), *[func.max(c) for c in columns]).select_from(model).one()
+    return tuple(row)
+
+
+async def atable_fingerprint(model):
+    """
+    Async version of table_fingerprint, executed with async_session
+    """
+    columns = [getattr(model, c) for c in fingerprint_columns(model)]
+    statement = select_columns(
+        func.count(), *[func.max(c) for c in columns]
+    ).select_from(model.__table__)
+    async with async_session() as s:
+        row = (await s.execute(statement)).one()
+    return tuple(row)
+
+
+def snapshot_key(namespace, components):
+    """
+    Returns a hex digest identifying the data of components, a dict of name to
+    ORMComponent, from the compiled SQL and bind parameters of their querysets
+    and the fingerprints of their tables
+    """
+    h = hashlib.sha256(namespace.encode())
+    fingerprints = {}
+    for name in sorted(components):
+        c = components[name]
+        queryset = c.queryset if c.queryset is not None else c.model.query()
+        compiled = queryset.statement.compile(dialect=queryset.session.bind.dialect)
+        for model in c.models:
+            if model not in fingerprints:
+                fingerprints[model] = table_fingerprint(model)
+        h.update(repr((
+            name,
+            c.data_spec,
+            str(compiled),
+            sorted(compiled.params.items()),
+            [fingerprints[model] for model in c.models]
+        )).encode())
+    return h.hexdigest()
@@ -23,4 +23,9 @@ def as_dataframe(query):
     """
     Returns the results of a query as a pandas as_dataframe
     """
-    return pd.read_sql(query.statement, query.session.bind)
+    result = query.session.connection().execute(query.statement)
+    return pd.DataFrame.from_records(
+        result.fetchall(),
+        columns=list(result.keys()),
+        coerce_float=True
+    )
@@ -1,6 +1,8 @@
 from .base import ORMComponent, BaseORMWrapper
-from .orm_components import ORMSet, ORMParam, ORMVar, ORMConstraint, ORMObjective
+from .orm_components import (ORMSet, ORMParam, ORMVar, ORMConstraint,
+                             ORMLinearConstraint, ORMObjective)
 from .decorators import orm_constraint, orm_objective
 
-__all__ = ['ORMSet', 'ORMParam', 'ORMVar', 'ORMConstraint', 'ORMObjective',
+__all__ = ['ORMSet', 'ORMParam', 'ORMVar', 'ORMConstraint', 'ORMLinearConstraint',
+    'ORMObjective',
     'orm_constraint', 'orm_objective']
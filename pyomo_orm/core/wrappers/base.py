@@ -1,9 +1,15 @@
 import weakref
 
+from pyomo_orm.core.kernel import product_index
+
 class BaseORMWrapper:
     def __init__(self, *index_orm_sets):
         self._index_orm_set_names = index_orm_sets
         self._problem_object = None
+        self._name = None
+
+    def __set_name__(self, owner, name):
+        self._name = name
 
     @property
     def _problem(self):
@@ -25,16 +31,29 @@ class BaseORMWrapper:
 
     @property
     def index_pyomo_sets(self):
+        return self.index_sets_of(self._problem().pyomo_model)
+
+    def index_sets_of(self, pyomo_model):
+        """
+        Returns the index sets of this component as found on pyomo_model
+        """
         ret = []
         for set_name in self._index_orm_set_names:
             ret.append(
                 getattr(
-                    self._problem().pyomo_model,
+                    pyomo_model,
                     set_name
                 )
             )
         return ret
 
+    def kernel_index(self, block):
+        """
+        Returns an iterator of the indices of this component on the kernel
+        block, from the member lists of its index sets
+        """
+        return product_index(self.index_sets_of(block))
+
 
 class ORMComponent(BaseORMWrapper):
     """
@@ -48,6 +67,8 @@ class ORMComponent(BaseORMWrapper):
         * indexed_by: the column which indexes the component. If index_orm_sets
             are also provided the values of the indexed_by column must appear
             in the ORMSets in the index_orm_sets. Defaults to id
+            from_attr and indexed_by may be dotted relationship paths, e.g.
+            'food.name', selected with a join
         * queryset: The query to use on the ORM model to define the index set
             data. Only one of queryest and index_orm_sets are required
         * pyomo component kwargs: kwargs to pass on to pyomo when creating the
@@ -76,13 +97,52 @@ class ORMComponent(BaseORMWrapper):
         """
         return self.queryset.all()
 
+    @property
+    def models(self):
+        """
+        Returns a tuple of the model and the related models joined to fetch
+        this component's data
+        """
+        return self.model.related_models(
+            *self.model._value_attrs(self.from_attr),
+            *self.model._index_attrs(self.indexed_by)
+        )
+
+    @property
+    def model_ids(self):
+        """
+        Returns the problem's LazyModelIds for this component's model and
+        queryset
+        """
+        return self._problem().model_ids_for(self.model, self.queryset)
+
+    def _cached_component(self, build):
+        """
+        Returns the pyomo component made by build, memoised on the problem
+        until the problem is invalidated for one of this component's models
+        """
+        return self._problem().cached_component(self._name, self.models, build)
+
     @property
     def problem_data(self):
         """
-        Returns the problem data from the model
+        Returns the problem data from the model, memoised on the problem
+        """
+        return self._problem().cached_data(self._name, self.models, self._fetch_data)
+
+    @property
+    def data_spec(self):
+        """
+        Returns the (from_attr, indexed_by, default) this component's data is
+        fetched with; see get_data_many
         """
+        return (self.from_attr, self.indexed_by, None)
+
+    def _fetch_data(self):
+        from_attr, indexed_by, default = self.data_spec
         return self.model.get_data(
-            from_attr=self.from_attr,
-            indexed_by=self.indexed_by,
-            queryset=self.queryset
+            from_attr=from_attr,
+            indexed_by=indexed_by,
+            queryset=self.queryset,
+            default=default
         )
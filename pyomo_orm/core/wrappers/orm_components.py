@@ -1,47 +1,223 @@
-from pyomo.environ import Constraint, Objective
+import functools
+import operator
+import weakref
 
+import numpy as np
+import pyomo.kernel as pmo
+from pyomo.core.expr.numeric_expr import LinearExpression
+from pyomo.core.base.param import ParamData
+from pyomo.environ import Constraint, Objective, Param
+
+from pyomo_orm.core.kernel import (ParamValues, extract_values, rule_args,
+                                   variable_kwargs)
 from .base import ORMComponent, BaseORMWrapper
 
 class ORMSet(ORMComponent):
+    """
+    A wrapper for sets of the values of the from_attr column.
+
+    If from_attr is a tuple of columns the set holds the combinations of
+    their values that occur in the rows, e.g. the (food_id, nutrient_id)
+    pairs of FoodNutrientAmount. Params, vars and constraints indexed by it
+    only have entries for those combinations rather than the cross product
+    of their parent sets. The parent sets, one per column, are given as the
+    index_orm_sets and must be defined before this set; members are
+    checked against them without building the product.
+    """
+    @property
+    def data_spec(self):
+        """
+        As ORMComponent.data_spec. A set of tuples is never indexed.
+        """
+        if not isinstance(self.from_attr, str):
+            return (self.from_attr, None, None)
+        return super().data_spec
+
     @property
     def pyomo_set(self):
         """
-        Returns the pyomo set
+        Returns the pyomo set, memoised on the problem
         """
+        return self._cached_component(self._create_pyomo_set)
+
+    def _create_pyomo_set(self, pyomo_model=None, **kwargs):
+        set_kwargs = {}
+        if not isinstance(self.from_attr, str):
+            set_kwargs = self._tuple_set_kwargs(pyomo_model)
+        set_kwargs.update(self._kwargs)
+        set_kwargs.update(kwargs)
         return self.model.create_set(
             from_attr=self.from_attr,
             indexed_by=self.indexed_by,
             queryset=self.queryset,
-            **self._kwargs
+            model_ids=self.model_ids,
+            **set_kwargs
         )
 
+    def _tuple_set_kwargs(self, pyomo_model=None):
+        """
+        Returns the dimen and, if there are parent sets, the within kwargs of
+        a set of tuples of the from_attr columns
+        """
+        kwargs = {'dimen': len(self.from_attr)}
+        if self._index_orm_set_names:
+            if len(self._index_orm_set_names) != len(self.from_attr):
+                raise ValueError(
+                    '{} needs one parent set per from_attr column'.format(self._name)
+                )
+            if pyomo_model is None:
+                pyomo_model = self._problem().pyomo_model
+            kwargs['within'] = functools.reduce(
+                operator.mul,
+                self.index_sets_of(pyomo_model)
+            )
+        return kwargs
+
+    def concrete_set(self, data, pyomo_model=None):
+        """
+        Returns a pyomo set for a ConcreteModel initialised from data, as
+        returned by problem_data. pyomo_model holds its parent sets, if any.
+        """
+        s = self._create_pyomo_set(pyomo_model)
+        s.construct({None: self.members(data)})
+        return s
+
+    @staticmethod
+    def members(data):
+        """
+        Returns the list of members in data, as returned by problem_data. A
+        kernel block holds its sets as these lists; members of tuple sets
+        are not checked against their parent sets.
+        """
+        values = data.get(None, [])
+        if not isinstance(values, list):
+            values = [values]
+        return values
+
 
 class ORMParam(ORMComponent):
+    @property
+    def data_spec(self):
+        """
+        As ORMComponent.data_spec. Entries equal to the Param's default are
+        not fetched, as pyomo fills them in.
+        """
+        return (self.from_attr, self.indexed_by, self._kwargs.get('default'))
+
     @property
     def pyomo_param(self):
         """
-        Returns the pyomo Param
+        Returns the pyomo Param, memoised on the problem
         """
+        return self._cached_component(self._create_pyomo_param)
+
+    def _create_pyomo_param(self, pyomo_model=None, **kwargs):
+        if pyomo_model is None:
+            pyomo_model = self._problem().pyomo_model
         return self.model.create_param(
-            *self.index_pyomo_sets,
+            *self.index_sets_of(pyomo_model),
             from_attr=self.from_attr,
             indexed_by=self.indexed_by,
             queryset=self.queryset,
-            **self._kwargs
+            model_ids=self.model_ids,
+            **dict(self._kwargs, **kwargs)
         )
 
+    def concrete_param(self, pyomo_model, data, mutable=False):
+        """
+        Returns a pyomo Param indexed by the sets of the ConcreteModel
+        pyomo_model and constructed from data, as returned by problem_data.
+        The mutable kwarg of the ORMParam takes precedence over mutable.
+
+        The entries of an indexed Param without a rule, validate or units
+        are assigned directly, skipping pyomo's check of each index against
+        the index sets and each value against the domain: both were fetched
+        from the database together.
+        """
+        kwargs = {'mutable': mutable}
+        kwargs.update(self._kwargs)
+        p = self._create_pyomo_param(pyomo_model, **kwargs)
+        if not p.is_indexed() or p._rule is not None or p._validate is not None \
+                or p._units is not None:
+            p.construct(data)
+            return p
+        p.construct()
+        if p.mutable:
+            p._data.update((k, self._param_data(p, k, v)) for k, v in data.items())
+        else:
+            p._data.update(data)
+        return p
+
+    @staticmethod
+    def _param_data(param, index, value):
+        """
+        Returns the ParamData of a mutable param at index, holding value
+        """
+        d = ParamData(param)
+        d._value = value
+        d._index = index
+        return d
+
+    def kernel_param(self, data):
+        """
+        Returns the values of the param for a kernel block from data, as
+        returned by problem_data: a ParamValues, or the value of a param
+        with no index sets. Only the default kwarg of the ORMParam is used.
+        """
+        default = self._kwargs.get('default', Param.NoValue)
+        if not self._index_orm_set_names:
+            return data.get(None, None if default is Param.NoValue else default)
+        return ParamValues(data, default)
+
 class ORMVar(ORMComponent):
     @property
     def pyomo_var(self):
         """
-        Returns the pyomo Var
+        Returns the pyomo Var, memoised on the problem
         """
+        return self._cached_component(self._create_pyomo_var)
+
+    def _create_pyomo_var(self, pyomo_model=None, **kwargs):
+        if pyomo_model is None:
+            pyomo_model = self._problem().pyomo_model
         return self.model.create_var(
-            *self.index_pyomo_sets,
+            *self.index_sets_of(pyomo_model),
             from_attr=self.from_attr,
             indexed_by=self.indexed_by,
             queryset=self.queryset,
-            **self._kwargs
+            model_ids=self.model_ids,
+            **dict(self._kwargs, **kwargs)
+        )
+
+    def kernel_var(self, block):
+        """
+        Returns a kernel variable_dict with a variable for each index of the
+        sets of block, or a single variable if there are no index sets
+        """
+        kwargs = variable_kwargs(self._kwargs)
+        if not self._index_orm_set_names:
+            return pmo.variable(**kwargs)
+        return pmo.variable_dict(
+            (k, pmo.variable(**kwargs)) for k in self.kernel_index(block)
+        )
+
+    def write_back(self, instance=None, problem_run=None):
+        """
+        Writes the values of the var in instance (defaults to the problem's
+        instance) to the from_attr column of the model, keyed by indexed_by.
+        If problem_run is given, updated rows are also associated with it.
+        """
+        if instance is None:
+            instance = self._problem().instance
+        data = extract_values(getattr(instance, self._name))
+        values = None
+        if problem_run is not None and 'problem_run_id' in self.model.__table__.c:
+            values = {'problem_run_id': problem_run.id}
+        self.model.set_data(
+            data,
+            from_attr=self.from_attr,
+            indexed_by=self.indexed_by,
+            values=values
         )
 
 class ORMRuleBase(BaseORMWrapper):
@@ -66,12 +242,256 @@ class ORMConstraint(ORMRuleBase):
     """
     @property
     def pyomo_constraint(self):
+        return self.create_constraint(self._problem().pyomo_model)
+
+    def create_constraint(self, pyomo_model):
         return Constraint(
-            *self.index_pyomo_sets,
+            *self.index_sets_of(pyomo_model),
             rule=self.rule,
             **self._kwargs
         )
 
+    def kernel_constraint(self, block):
+        """
+        Returns a kernel constraint_dict of the rule's constraint for each
+        index of the sets of block, or a single constraint if there are no
+        index sets (None if the rule skips it)
+        """
+        if not self._index_orm_set_names:
+            expr = self.rule(block)
+            return None if expr is Constraint.Skip else pmo.constraint(expr)
+        c = pmo.constraint_dict()
+        for k in self.kernel_index(block):
+            expr = self.rule(block, *rule_args(k))
+            if expr is not Constraint.Skip:
+                c[k] = pmo.constraint(expr)
+        return c
+
+class ORMLinearConstraint(ORMConstraint):
+    """
+    A family of linear constraints
+
+        lower[r] <= sum(coefficient[r, v] * var[v]) <= upper[r]
+
+    for each r of the index_orm_sets, with the coefficients read from the
+    from_attr column of model. row_by and var_by are the column(s) giving
+    r and v of each coefficient.
+
+    The coefficients are fetched as numpy arrays and each row is built as a
+    LinearExpression in one pass over them, rather than by a rule summing
+    python expressions. On a kernel block each row is a linear_constraint.
+
+    The coefficients are part of the problem data, under data_key, and an
+    instance is built from the coefficients in the data it is given.
+
+    Arguments:
+        * var: the name of the problem's ORMVar
+        * lower, upper: the name of a param indexed by r, a number or None
+        * model, from_attr, queryset: as for ORMComponent
+        * pyomo component kwargs: kwargs to pass on to the Constraint
+    """
+    def __init__(
+        self,
+        *index_orm_sets,
+        var=None,
+        model=None,
+        from_attr=None,
+        row_by=None,
+        var_by=None,
+        lower=None,
+        upper=None,
+        queryset=None,
+        **kwargs
+    ):
+        super().__init__(*index_orm_sets, rule=self._row, **kwargs)
+        self.var = var
+        self.model = model
+        self.from_attr = from_attr
+        self.row_by = row_by
+        self.var_by = var_by
+        self.lower = lower
+        self.upper = upper
+        self.queryset = queryset
+
+    @property
+    def models(self):
+        """
+        Returns a tuple of the model and the related models joined to fetch
+        the coefficients
+        """
+        return self.model.related_models(self.from_attr, *self._row_attrs, *self._var_attrs)
+
+    @property
+    def data_key(self):
+        """
+        Returns the key of the coefficients in the problem data. It is not a
+        component name, so pyomo doesn't construct the Constraint from them.
+        """
+        return '{}.coefficients'.format(self._name)
+
+    @property
+    def data_spec(self):
+        """
+        Returns the (from_attr, indexed_by, default) the coefficients are
+        fetched with: the row_by and var_by columns index them
+        """
+        return (self.from_attr, self._row_attrs + self._var_attrs, None)
+
+    @property
+    def coefficients(self):
+        """
+        Returns the row_by, var_by and from_attr columns as numpy arrays,
+        memoised on the problem
+        """
+        return self._problem().cached_data(self.data_key, self.models, self._fetch_coefficients)
+
+    def coefficients_in(self, di):
+        """
+        Returns the coefficients in di, the problem data of a namespace, or
+        the problem's coefficients if di doesn't hold them
+        """
+        if di is not None and self.data_key in di:
+            return di[self.data_key]
+        return self.coefficients
+
+    @property
+    def _row_attrs(self):
+        return self.model._index_attrs(self.row_by)
+
+    @property
+    def _var_attrs(self):
+        return self.model._index_attrs(self.var_by)
+
+    def _fetch_coefficients(self):
+        from_attr, indexed_by, _ = self.data_spec
+        return self.model.get_data(
+            from_attr=from_attr,
+            indexed_by=indexed_by,
+            queryset=self.queryset,
+            columnar='numpy'
+        )
+
+    async def afetch_coefficients(self):
+        """
+        Async version of _fetch_coefficients, executed with async_session
+        """
+        from_attr, indexed_by, _ = self.data_spec
+        return await self.model.aget_data(
+            from_attr=from_attr,
+            indexed_by=indexed_by,
+            queryset=self.queryset,
+            columnar='numpy'
+        )
+
+    def rows(self, pyomo_model):
+        """
+        Returns a dict of each r to its (lower, LinearExpression, upper), with
+        the var and bound params of pyomo_model
+        """
+        return {
+            r: (
+                lower,
+                LinearExpression(constant=0, linear_coefs=coefs, linear_vars=var_data),
+                upper
+            ) for r, lower, coefs, var_data, upper in self._row_terms(pyomo_model)
+        }
+
+    def kernel_constraint(self, block):
+        """
+        Returns a kernel constraint_dict of a linear_constraint for each r of
+        the sets of block that has coefficients
+        """
+        index = set(self.kernel_index(block))
+        c = pmo.constraint_dict()
+        for r, lower, coefs, var_data, upper in self._row_terms(block):
+            if r in index:
+                c[r] = pmo.linear_constraint(
+                    variables=var_data,
+                    coefficients=coefs,
+                    lb=lower,
+                    ub=upper
+                )
+        return c
+
+    def _row_terms(self, pyomo_model):
+        """
+        Yields (r, lower, coefficients, vars, upper) for each row, with the
+        var and bound params of pyomo_model and the coefficients of the
+        data it is being built from
+        """
+        columns = self.coefficients_in(self._problem()._build_data)
+        row_columns = [columns[a] for a in self._row_attrs]
+        var_columns = [columns[a] for a in self._var_attrs]
+        order = np.lexsort(row_columns[::-1])
+        var = getattr(pyomo_model, self.var)
+        var_keys = self._keys([c[order] for c in var_columns])
+        # terms of vars outside the var's index, as a rule over its index
+        # set would leave out, are dropped
+        keep = np.fromiter((k in var for k in var_keys), dtype=bool, count=len(var_keys))
+        if not keep.all():
+            order = order[keep]
+            var_keys = [k for k, kept in zip(var_keys, keep.tolist()) if kept]
+        row_columns = [c[order] for c in row_columns]
+        coefs = columns[self.from_attr][order].tolist()
+        var_data = [var[k] for k in var_keys]
+        # the first position of each row
+        changes = np.zeros(len(order), dtype=bool)
+        changes[:1] = True
+        for c in row_columns:
+            changes[1:] |= c[1:] != c[:-1]
+        starts = np.flatnonzero(changes).tolist()
+        row_keys = self._keys([c[starts] for c in row_columns])
+        lower = self._bound(pyomo_model, self.lower)
+        upper = self._bound(pyomo_model, self.upper)
+        for r, start, end in zip(row_keys, starts, starts[1:] + [len(order)]):
+            yield r, lower(r), coefs[start:end], var_data[start:end], upper(r)
+
+    @staticmethod
+    def _keys(columns):
+        """
+        Returns the pyomo indices made by the values of columns: scalars for
+        a single column, tuples for several
+        """
+        if len(columns) == 1:
+            return columns[0].tolist()
+        return list(zip(*[c.tolist() for c in columns]))
+
+    @staticmethod
+    def _bound(pyomo_model, bound):
+        """
+        Returns a function of r giving the bound: an entry of the param
+        named bound, or the constant bound
+        """
+        if isinstance(bound, str):
+            return getattr(pyomo_model, bound).__getitem__
+        return lambda r: bound
+
+    def _row(self, m, *index):
+        """
+        The rule of the Constraint: the rows are built for all of m on the
+        first call and held by the problem until the rule has been called
+        for every index; each call returns its prebuilt row
+        """
+        built_rows = self._problem()._built_rows
+        name = (self._name, id(m))
+        built = built_rows.get(name)
+        if built is None or built['model']() is not m:
+            built = built_rows[name] = {
+                'model': weakref.ref(m),
+                'rows': self.rows(m),
+                'remaining': functools.reduce(
+                    operator.mul,
+                    [len(s) for s in self.index_sets_of(m)],
+                    1
+                )
+            }
+        built['remaining'] -= 1
+        if built['remaining'] <= 0:
+            del built_rows[name]
+        key = index[0] if len(index) == 1 else index
+        return built['rows'].pop(key, Constraint.Skip)
+
+
 class ORMObjective(ORMRuleBase):
     """
     A wrapper for objectives. It acts as a container for the index_pyomo_sets as
@@ -80,8 +500,24 @@ class ORMObjective(ORMRuleBase):
     """
     @property
     def pyomo_objective(self):
+        return self.create_objective(self._problem().pyomo_model)
+
+    def create_objective(self, pyomo_model):
         return Objective(
-            *self.index_pyomo_sets,
+            *self.index_sets_of(pyomo_model),
             rule=self.rule,
             **self._kwargs
         )
+
+    def kernel_objective(self, block):
+        """
+        Returns a kernel objective_dict of the rule's objective for each
+        index of the sets of block, or a single objective if there are no
+        index sets
+        """
+        if not self._index_orm_set_names:
+            return pmo.objective(self.rule(block), **self._kwargs)
+        return pmo.objective_dict(
+            (k, pmo.objective(self.rule(block, *rule_args(k)), **self._kwargs))
+            for k in self.kernel_index(block)
+        )
@@ -14,5 +14,11 @@ setup(
         'SQLAlchemy>=1.2',
         'Pyomo>=5.2'
         'Pandas>=0.22.0'
-    ]
+    ],
+    extras_require={
+        'async': [
+            'SQLAlchemy>=1.4',
+            'aiosqlite'
+        ]
+    }
 )
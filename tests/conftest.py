@@ -0,0 +1,34 @@
+"""
+Fixtures shared by the tests. The tests use the diet models, problem and
+data generator of the benchmarks.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+from diet import Session, setup
+
+
+@pytest.fixture
+def diet_db(tmp_path):
+    """
+    Returns a function filling a database with the diet data of n_foods
+    foods and n_nutrients nutrients and binding it. The database is a file
+    in tmp_path, or in memory if in_memory.
+    """
+    engines = []
+
+    def make(n_foods=200, n_nutrients=20, in_memory=False):
+        url = 'sqlite://'
+        if not in_memory:
+            url = 'sqlite:///{}'.format(tmp_path / 'diet.sqlite')
+        engines.append(setup(n_foods, n_nutrients, url))
+        return url
+
+    yield make
+    Session.remove()
+    for engine in engines:
+        engine.dispose()
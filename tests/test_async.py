@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('sqlalchemy.ext.asyncio')
+pytest.importorskip('aiosqlite')
+
+from pyomo.environ import Constraint, Objective, Param, Set, Var, value
+
+from bench_linear import LinearDietProblem
+from diet import DietProblem
+from pyomo_orm.core.database import bind_async_engine
+from pyomo_orm.core.problems import AsyncBaseProblem
+
+
+class AsyncDietProblem(AsyncBaseProblem, DietProblem):
+    pass
+
+
+class AsyncLinearDietProblem(AsyncBaseProblem, LinearDietProblem):
+    pass
+
+
+def describe(instance):
+    """
+    Returns the members of the sets, values of the params, indices of the
+    vars and expressions of the constraints and objectives of instance
+    """
+    return {
+        'sets': {s.name: sorted(s) for s in instance.component_objects(Set)},
+        'params': {
+            p.name: {k: value(v) for k, v in p.items()}
+            for p in instance.component_objects(Param)
+        },
+        'vars': {v.name: sorted(v) for v in instance.component_objects(Var)},
+        'constraints': {
+            c.name: {k: str(d.expr) for k, d in c.items()}
+            for c in instance.component_objects(Constraint)
+        },
+        'objectives': {o.name: str(o.expr) for o in instance.component_objects(Objective)},
+    }
+
+
+async def abuild(problem_class, name):
+    problem = problem_class(name)
+    problem.define_problem()
+    instance = await problem.acreate_instance()
+    return problem, instance
+
+
+def build(problem_class, name):
+    problem = problem_class(name)
+    problem.define_problem()
+    return problem, problem.create_instance()
+
+
+@pytest.fixture
+def async_diet_db(diet_db):
+    url = diet_db(30, 5)
+    bind_async_engine(url.replace('sqlite://', 'sqlite+aiosqlite://'))
+
+
+@pytest.mark.parametrize('problem_class', [AsyncDietProblem, AsyncLinearDietProblem])
+def test_async_build_equals_sync_build(async_diet_db, problem_class):
+    _, async_instance = asyncio.run(abuild(problem_class, 'async'))
+    _, instance = build(problem_class, 'sync')
+    assert describe(async_instance) == describe(instance)
+
+
+def test_async_data_equals_data(async_diet_db):
+    problem = AsyncLinearDietProblem('adata')
+    problem.define_problem()
+    adata = asyncio.run(problem.adata())
+    problem.invalidate()
+    data = problem.data
+    assert adata.keys() == data.keys()
+    for name, values in data[problem.namespace].items():
+        if name.endswith('.coefficients'):
+            assert values.keys() == adata[problem.namespace][name].keys()
+            for column, array in values.items():
+                assert (array == adata[problem.namespace][name][column]).all()
+        else:
+            assert values == adata[problem.namespace][name]
+
+
+def test_concurrent_async_builds_equal_sync_build(async_diet_db):
+    async def abuild_all():
+        return await asyncio.gather(*[
+            abuild(AsyncLinearDietProblem, 'async_{}'.format(i)) for i in range(3)
+        ])
+
+    built = asyncio.run(abuild_all())
+    _, instance = build(AsyncLinearDietProblem, 'sync')
+    expected = describe(instance)
+    for _, instance in built:
+        assert describe(instance) == expected
@@ -0,0 +1,10 @@
+from diet import DietProblem
+
+
+def test_orm_component_dicts_are_mutable_copies():
+    problem = DietProblem('Diet')
+    orm_sets = problem.orm_sets
+    orm_sets.update(problem.orm_params)
+    del orm_sets['foods']
+    assert list(problem.orm_sets) == ['foods', 'nutrients']
+    assert 'amount' not in problem.orm_sets
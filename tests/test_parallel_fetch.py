@@ -0,0 +1,28 @@
+import pytest
+
+from check_parallel_fetch import (BrokenParallelDietProblem, ParallelDietProblem,
+                                  fetch, ordered)
+from diet import DietProblem
+
+
+def test_parallel_fetch_equals_serial_fetch(diet_db, monkeypatch):
+    diet_db(300, 20)
+    threaded = []
+    fetch_group_in_thread = ParallelDietProblem._fetch_group_in_thread
+
+    def spy(self, key, group):
+        threaded.append(key)
+        return fetch_group_in_thread(self, key, group)
+
+    monkeypatch.setattr(ParallelDietProblem, '_fetch_group_in_thread', spy)
+    serial, _ = fetch(DietProblem, 'serial')
+    parallel, _ = fetch(ParallelDietProblem, 'parallel')
+    assert len(threaded) > 1
+    assert parallel == serial
+    assert ordered(parallel) == ordered(serial)
+
+
+def test_parallel_fetch_raises_worker_errors(diet_db):
+    diet_db(20, 5)
+    with pytest.raises(AttributeError, match='no_such_column'):
+        fetch(BrokenParallelDietProblem, 'broken')
@@ -0,0 +1,29 @@
+import pytest
+
+from bench_streaming import MAX_RATIOS, measure
+from diet import FoodNutrientAmount
+
+
+@pytest.mark.parametrize('columnar', [None, 'numpy'])
+def test_chunked_peak_memory_stays_close_to_result(diet_db, columnar):
+    diet_db(2000, 50, in_memory=True)
+    peaks = {}
+    for mode, chunk_size in (('all', None), ('chunked', 5000)):
+        _, peak, result = measure(
+            FoodNutrientAmount.get_data,
+            'amount',
+            ('food_id', 'nutrient_id'),
+            columnar=columnar,
+            chunk_size=chunk_size
+        )
+        peaks[mode] = peak / result
+    assert peaks['chunked'] < MAX_RATIOS[columnar or 'dict'] < peaks['all']
+
+
+def test_chunked_result_equals_unchunked(diet_db):
+    diet_db(50, 10, in_memory=True)
+    indexed_by = ('food_id', 'nutrient_id')
+    assert (
+        FoodNutrientAmount.get_data('amount', indexed_by, chunk_size=7)
+        == FoodNutrientAmount.get_data('amount', indexed_by)
+    )
@@ -0,0 +1,41 @@
+from sqlalchemy import inspect, text
+
+from diet import DietProblem, Session, bind_engine, populate
+from pyomo_orm.core.models import ProblemRun, ProblemRunMembership, upgrade_schema
+
+# problem_runs and problem_details as created by pyomo-orm 0.1
+OLD_SCHEMA = [
+    'CREATE TABLE problem_details (id INTEGER PRIMARY KEY, name VARCHAR, '
+    'description VARCHAR, version VARCHAR)',
+    'CREATE TABLE problem_runs (id INTEGER PRIMARY KEY, '
+    'problem_details_id INTEGER REFERENCES problem_details (id))',
+    "INSERT INTO problem_details VALUES (1, 'Diet', NULL, NULL)",
+    'INSERT INTO problem_runs VALUES (1, 1)',
+]
+
+
+def test_upgrade_schema_adds_run_columns_and_tables(tmp_path):
+    engine = bind_engine('sqlite:///{}'.format(tmp_path / 'old.sqlite'))
+    try:
+        with engine.begin() as conn:
+            for ddl in OLD_SCHEMA:
+                conn.execute(text(ddl))
+        executed = upgrade_schema()
+        assert any('ADD COLUMN n_nonzeros' in ddl for ddl in executed)
+        inspector = inspect(engine)
+        assert 'problem_run_metrics' in inspector.get_table_names()
+        assert 'problem_run_memberships' in inspector.get_table_names()
+        assert upgrade_schema() == []
+
+        populate(20, 5)
+        problem = DietProblem('Diet')
+        problem.define_problem()
+        problem.create_instance()
+        problem._record_solve(None)
+        old, new = ProblemRun.query().order_by(ProblemRun.id).all()
+        assert old.n_vars is None
+        assert new.n_vars == 20
+        assert ProblemRunMembership.query().filter_by(problem_run_id=new.id).count()
+    finally:
+        Session.remove()
+        engine.dispose()